@@ -0,0 +1,93 @@
+import argparse
+import math
+
+import airsim
+import rm_bot_client.rm_bot_client as rm_bot_client
+import robo_magellan_orchestrator.robo_magellan_orchestrator as robo_magellan_orchestrator
+import robo_magellan_orchestrator.batch_runner as batch_runner
+import robo_magellan_orchestrator.run_scheduler as run_scheduler
+import robo_magellan_orchestrator.telemetry as telemetry
+
+class GoToGoalController(object):
+    """ Example controller: turns towards the goal point and drives straight at it. """
+    def __init__(self, throttle=0.7, heading_gain=1.0):
+        self.throttle = throttle
+        self.heading_gain = heading_gain
+
+    def __call__(self, client, orchestrator):
+        snapshot = orchestrator.last_snapshot
+        goal_center = orchestrator.goal_point.goal_center
+        if (snapshot is None or goal_center is None):
+            return (0, 0)
+
+        position = snapshot.pose.position
+        _, _, yaw = airsim.to_eularian_angles(snapshot.pose.orientation)
+        goal_heading = math.atan2(goal_center.y_val - position.y_val, goal_center.x_val - position.x_val)
+        heading_error = math.atan2(math.sin(goal_heading - yaw), math.cos(goal_heading - yaw))
+
+        turn = max(-1.0, min(1.0, self.heading_gain * heading_error))
+        forward = self.throttle * max(0.0, math.cos(heading_error))
+
+        # Yaw increases clockwise in NED, so turning towards a positive heading error takes a faster left wheel
+        return (forward + (turn * self.throttle), forward - (turn * self.throttle))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Executes many orchestrated runs back to back.')
+    parser.add_argument('--config', default='TestOrchestrationConfiguration.json', help='Path to the orchestrator configuration file.')
+    parser.add_argument('--first-seed', type=int, default=0, help='Seed of the first run.')
+    parser.add_argument('--num-runs', type=int, default=10, help='Number of runs. Run i uses seed first-seed + i.')
+    parser.add_argument('--controller', default='BatchOrchestratorRun:GoToGoalController', help='"module:factory" of the controller to use.')
+    parser.add_argument('--results', default='results.jsonl', help='File the per-run results are streamed to.')
+    parser.add_argument('--format', choices=['jsonl', 'csv'], default='jsonl', help='Format of the results file.')
+    parser.add_argument('--endpoints', default=None, help='Comma separated ip:port list of simulators to spread the runs over, e.g. 127.0.0.1:41451,127.0.0.1:41452.')
+    parser.add_argument('--step-seconds', type=float, default=None, help='If set, the sim is paused and advanced in lock-step by this many sim seconds per tick, and runs are scored in sim time.')
+    parser.add_argument('--telemetry', default=None, help='If set, every tick of every run is recorded to this binary file, described by a .json file next to it. With --endpoints, each simulator gets its own file.')
+    parser.add_argument('--max-retries', type=int, default=2, help='Number of times a failed run is retried when running on several simulators.')
+
+    return parser.parse_args()
+
+def parse_endpoints(endpoints):
+    parsed_endpoints = []
+    for endpoint in endpoints.split(','):
+        ip, port = endpoint.strip().rsplit(':', 1)
+        parsed_endpoints.append((ip, int(port)))
+
+    return parsed_endpoints
+
+def main():
+    args = parse_args()
+    controller_factory = batch_runner.load_controller_factory(args.controller)
+    seeds = range(args.first_seed, args.first_seed + args.num_runs, 1)
+
+    if (args.endpoints is not None):
+        scheduler = run_scheduler.ParallelRunScheduler(args.config, parse_endpoints(args.endpoints), controller_factory, args.max_retries, step_seconds=args.step_seconds, telemetry_file_path=args.telemetry)
+        statistics = scheduler.run(seeds, args.results, args.format)
+
+        print('Completed {0} runs in {1:.1f} seconds ({2:.1f} runs/hour).'.format(statistics['runs'], statistics['totalSeconds'], statistics['runsPerHour']))
+        print('Sim seconds per wall second: {0:.2f}'.format(statistics['simSecondsPerWallSecond']))
+        for endpoint, num_runs in sorted(statistics['runsPerEndpoint'].items()):
+            print('  {0}: {1} runs'.format(endpoint, num_runs))
+        for failure in statistics['failures']:
+            print('Seed {0} failed on {1}:\n{2}'.format(failure['seed'], failure['endpoint'], failure['error']))
+        return
+
+    client = rm_bot_client.RmBotClient()
+    orchestrator = robo_magellan_orchestrator.RoboMagellanCompetitionOrchestrator(args.config)
+
+    telemetry_recorder = None
+    if (args.telemetry is not None):
+        telemetry_recorder = telemetry.TelemetryRecorder(args.telemetry)
+
+    runner = batch_runner.BatchRunner(orchestrator, client, controller_factory(), args.results, args.format, args.step_seconds, telemetry_recorder)
+    try:
+        statistics = runner.run(seeds)
+    finally:
+        if (telemetry_recorder is not None):
+            telemetry_recorder.close()
+
+    print('Completed {0} runs in {1:.1f} seconds ({2:.1f} runs/hour).'.format(statistics['runs'], statistics['totalSeconds'], statistics['runsPerHour']))
+    print('Mean spawn time: {0:.3f} s. Mean run time: {1:.3f} s. Mean cleanup time: {2:.3f} s.'.format(statistics['meanSpawnSeconds'], statistics['meanRunSeconds'], statistics['meanCleanupSeconds']))
+    print('Sim seconds per wall second: {0:.2f}'.format(statistics['simSecondsPerWallSecond']))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import argparse
+import json
+import math
+import sys
+import time
+
+import robo_magellan_orchestrator.offline_scoring as offline_scoring
+import robo_magellan_orchestrator.telemetry as telemetry
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Scores recorded runs again under the rules of a configuration file, without a simulator.')
+    parser.add_argument('telemetry', nargs='+', help='Telemetry files recorded with BatchOrchestratorRun.py --telemetry.')
+    parser.add_argument('--config', default=None, help='Configuration file to take the scoring rules from. Defaults to the rules the runs were recorded with.')
+    parser.add_argument('--results', default=None, help='File the per-run results are written to, as JSON lines.')
+    parser.add_argument('--verify', action='store_true', help='Checks that re-scoring under the recorded rules reproduces the recorded outcomes, and lists the runs that differ.')
+
+    args = parser.parse_args()
+    if (args.verify and args.config is not None):
+        parser.error('--verify re-scores under the recorded rules, and cannot be combined with --config.')
+
+    return args
+
+def main():
+    args = parse_args()
+    rules = offline_scoring.ScoringRules.from_config_file(args.config) if args.config is not None else None
+
+    start = time.perf_counter()
+    all_results = []
+    all_mismatches = []
+    for file_path in args.telemetry:
+        records, runs = telemetry.read_telemetry(file_path)
+        runs = [run for run in runs if not run.get('aborted', False)]
+        results = offline_scoring.rescore_runs(records, runs, rules)
+        if (args.verify):
+            all_mismatches.extend((file_path,) + mismatch for mismatch in offline_scoring.compare_with_recorded(results, runs))
+        for i in range(0, len(results['runIndex']), 1):
+            result = {}
+            result['file'] = file_path
+            for key, values in results.items():
+                value = values[i]
+                result[key] = value.item() if hasattr(value, 'item') else value
+            all_results.append(result)
+    total_seconds = time.perf_counter() - start
+
+    if (args.results is not None):
+        with open(args.results, 'w') as f:
+            for result in all_results:
+                # NaN is not valid JSON
+                if (result['runTimeSeconds'] is not None and math.isnan(result['runTimeSeconds'])):
+                    result['runTimeSeconds'] = None
+                f.write(json.dumps(result) + '\n')
+
+    num_runs = len(all_results)
+    print('Scored {0} runs in {1:.3f} seconds.'.format(num_runs, total_seconds))
+    if (num_runs > 0):
+        print('Mean score: {0:.3f}. Goals reached: {1}. Incomplete runs: {2}.'.format(sum(result['score'] for result in all_results) / num_runs,
+                                                                                     sum(1 for result in all_results if result['goalVisited']),
+                                                                                     sum(1 for result in all_results if not result['runComplete'])))
+
+    if (args.verify):
+        for file_path, run_index, field, recorded_value, replayed_value in all_mismatches:
+            print('{0} run {1}: {2} was recorded as {3}, but replays as {4}.'.format(file_path, run_index, field, recorded_value, replayed_value))
+        print('{0} differences from the recorded outcomes.'.format(len(all_mismatches)))
+        if (len(all_mismatches) > 0):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
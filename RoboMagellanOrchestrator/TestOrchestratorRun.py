@@ -5,6 +5,14 @@ import airsim
 import airsim.airsim_types as at
 import rm_bot_client.rm_bot_client as rm_bot_client
 import robo_magellan_orchestrator.robo_magellan_orchestrator as robo_magellan_orchestrator
+import robo_magellan_orchestrator.run_status as run_status
+
+class StatusPrinter(run_status.RunObserver):
+    def on_cone_visited(self, orchestrator, cone):
+        print('Cone visited at {0:.1f} seconds.'.format(orchestrator.status.elapsed_seconds))
+
+    def on_run_complete(self, orchestrator):
+        print('Run complete: {0}'.format(orchestrator.status.run_end_reason))
 
 def get_control_signals():
     w_pressed = keyboard.is_pressed('w')
@@ -50,18 +58,19 @@ def main():
 
     orchestrator.set_debug_draw_enabled(True)
     orchestrator.set_random_seed(47)
+    orchestrator.add_observer(StatusPrinter())
     orchestrator.start_new_run(client)
 
     os.system('cls')
     print('Competition is now running.')
 
-    status = orchestrator.get_run_summary(client)
-    while (not status['runComplete']):
+    # The status is updated in place by run_tick, so checking it is free
+    status = orchestrator.status
+    while (not status.run_complete):
         left_throttle, right_throttle = get_control_signals()
         client.drive(left_throttle, right_throttle)
 
         orchestrator.run_tick(client)
-        status = orchestrator.get_run_summary(client)
 
     client.drive(0, 0)
     status_string = orchestrator.get_run_summary_string(client)
@@ -1,14 +1,36 @@
-# Import this module to automatically setup path to local airsim module
-# This module first tries to see if airsim module is installed via pip
-# If it does then we don't do anything else
-# Else we look up grand-parent folder to see if it has airsim folder
-#    and if it does then we add that in sys.path
+# To use the local airsim module from a script outside of this folder, call SetupPath.addAirSimModulePath()
+# It looks up the parent folder to see if it has the airsim folder
+#    and if it does then adds that to sys.path
 
-import os,sys,inspect,logging
+import os,sys
+import importlib
 
-from .client import *
-from .utils import *
-from .airsim_types import *
+# The submodules are imported on first use of one of their names (PEP 562), so that "import airsim" is cheap and only
+# what is used gets loaded: e.g. airsim.Vector3r does not import msgpackrpc. The lookup order matches the order of the
+# star imports this replaced.
+_lazy_submodules = ('airsim_types', 'pfm', 'utils', 'client')
+
+def __getattr__(name):
+    if name == '__all__':
+        return __dir__()
+    if name.startswith('__'):
+        raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
+
+    for submodule_name in _lazy_submodules:
+        submodule = importlib.import_module('.' + submodule_name, __name__)
+        if not name.startswith('_') and name in vars(submodule):
+            value = getattr(submodule, name)
+            globals()[name] = value
+            return value
+
+    raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
+
+def __dir__():
+    names = set(['SetupPath'])
+    for submodule_name in _lazy_submodules:
+        submodule = importlib.import_module('.' + submodule_name, __name__)
+        names.update(name for name in vars(submodule) if not name.startswith('_'))
+    return sorted(names)
 
 #this class simply tries to see if airsim 
 class SetupPath:
@@ -19,8 +41,7 @@ class SetupPath:
 
     @staticmethod
     def getCurrentPath():
-        cur_filepath = os.path.abspath(inspect.getfile(inspect.currentframe()))
-        return os.path.dirname(cur_filepath)
+        return os.path.dirname(os.path.abspath(__file__))
 
     @staticmethod
     def getGrandParentDir():
@@ -51,6 +72,6 @@ class SetupPath:
             if os.path.exists(client_path):
                 sys.path.insert(0, parent)
         else:
+            import logging
             logging.warning("airsim module not found in parent folder. Using installed package (pip install airsim).")
 
-SetupPath.addAirSimModulePath()
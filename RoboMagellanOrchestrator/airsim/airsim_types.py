@@ -1,30 +1,122 @@
 from __future__ import print_function
-import msgpackrpc #install as admin: pip install msgpack-rpc-python
 import numpy as np #pip install numpy
 
 class MsgpackMixin:
+    __slots__ = ()
+
     def __repr__(self):
         from pprint import pformat
-        return "<" + type(self).__name__ + "> " + pformat(vars(self), indent=4, width=1)
+        return "<" + type(self).__name__ + "> " + pformat(self.to_msgpack(), indent=4, width=1)
 
     def to_msgpack(self, *args, **kwargs):
         return self.__dict__
 
     @classmethod
     def from_msgpack(cls, encoded):
-        obj = cls()
-        ww = encoded.items()
-        #obj.__dict__ = {k.decode('utf-8'): (from_msgpack(v.__class__, v) if hasattr(v, "__dict__") else v) for k, v in encoded.items()}
-        for k, v in encoded.items():
-            if (isinstance(v, dict) and hasattr(getattr(obj, k).__class__, 'from_msgpack')):
-                obj.__dict__[k] = getattr(getattr(obj, k).__class__, 'from_msgpack')(v)
+        return _get_decoders(cls)[0](encoded)
+
+    @classmethod
+    def from_msgpack_raw(cls, encoded):
+        """ Decodes to a tuple of the field values in declaration order (see msgpack_fields), with nested types as nested tuples. """
+        return _get_decoders(cls)[1](encoded)
+
+    @classmethod
+    def msgpack_fields(cls):
+        return _get_decoders(cls)[2]
+
+# Decoders are built on first use from the class-level field declarations, which double as the defaults
+_decoders = {}
+
+def _get_field_schema(cls):
+    if issubclass(cls, SlotsMsgpackMixin):
+        return dict(cls._field_defaults)
+
+    fields = {}
+    for klass in reversed(cls.__mro__):
+        for name, value in vars(klass).items():
+            if name.startswith('_') or callable(value) or isinstance(value, (classmethod, staticmethod, property)):
+                continue
+            fields[name] = value
+    return fields
+
+def _get_decoders(cls):
+    decoders = _decoders.get(cls)
+    if decoders is not None:
+        return decoders
+
+    fields = _get_field_schema(cls)
+    namespace = {'new_object': object.__new__, 'cls': cls}
+
+    # Both decoders are generated as straight-line code so that decoding does no per-field lookups on the class.
+    # Slotted types get their fields assigned one by one, the others get a copy of the message as their __dict__.
+    is_slotted = issubclass(cls, SlotsMsgpackMixin)
+    if is_slotted:
+        decode_source = ['def decode(encoded):', '    get = encoded.get', '    obj = new_object(cls)']
+    else:
+        decode_source = ['def decode(encoded):', '    values = dict(encoded)']
+    raw_values_source = []
+    for i, (name, default) in enumerate(fields.items()):
+        if isinstance(default, MsgpackMixin):
+            nested_decode, nested_decode_raw, _ = _get_decoders(type(default))
+            namespace['decode_{0}'.format(i)] = nested_decode
+            namespace['decode_raw_{0}'.format(i)] = nested_decode_raw
+            namespace['type_{0}'.format(i)] = type(default)
+            namespace['default_{0}'.format(i)] = nested_decode_raw({})
+
+            if is_slotted:
+                decode_source.append('    value = get({0!r})'.format(name))
+                decode_source.append('    obj.{0} = decode_{1}(value) if value.__class__ is dict else (type_{1}() if value is None else value)'.format(name, i))
             else:
-                obj.__dict__[k] = v
-                
-        #obj.__dict__ = { k : (v if not isinstance(v, dict) else getattr(getattr(obj, k).__class__, "from_msgpack")(v)) for k, v in encoded.items()}
-        #return cls(**msgpack.unpack(encoded))
-        return obj
+                decode_source.append('    value = values.get({0!r})'.format(name))
+                decode_source.append('    if value.__class__ is dict:')
+                decode_source.append('        values[{0!r}] = decode_{1}(value)'.format(name, i))
+            raw_values_source.append('decode_raw_{1}(encoded[{0!r}]) if {0!r} in encoded else default_{1}'.format(name, i))
+        else:
+            namespace['default_{0}'.format(i)] = default
+            if is_slotted:
+                decode_source.append('    obj.{0} = get({0!r}, default_{1})'.format(name, i))
+            raw_values_source.append('get({0!r}, default_{1})'.format(name, i))
+    if is_slotted:
+        decode_source += ['    return obj']
+    else:
+        decode_source += ['    obj = new_object(cls)', '    obj.__dict__ = values', '    return obj']
+
+    decode_raw_source = ['def decode_raw(encoded):', '    get = encoded.get', '    return ({0},)'.format(', '.join(raw_values_source)) if len(raw_values_source) > 0 else '    return ()']
+
+    exec('\n'.join(decode_source + decode_raw_source), namespace)
+
+    decoders = (namespace['decode'], namespace['decode_raw'], tuple(fields.keys()))
+    _decoders[cls] = decoders
+    return decoders
 
+class SlotsMsgpackMixin(MsgpackMixin):
+    """ Base of the small value types that are allocated per message.
+
+    Their fields are declared in __slots__, with the defaults used for decoding in _field_defaults, so instances carry no
+    __dict__. as_array() and from_array() convert to and from a flat float64 array, and stack() and unstack() do the same for
+    a sequence of values, which is the compact way to keep long histories of them.
+    """
+    __slots__ = ()
+    _field_defaults = {}
+
+    def to_msgpack(self, *args, **kwargs):
+        return {name: getattr(self, name) for name in self._field_defaults}
+
+    def as_array(self):
+        return np.array(self._as_list(), dtype=np.float64)
+
+    @classmethod
+    def from_array(cls, array):
+        return cls._from_list([float(value) for value in array])
+
+    @classmethod
+    def stack(cls, values):
+        """ Returns an (N, k) array of the as_array() of each value. """
+        return np.array([value._as_list() for value in values], dtype=np.float64).reshape(-1, cls._array_size)
+
+    @classmethod
+    def unstack(cls, array):
+        return [cls._from_list(row) for row in np.asarray(array, dtype=np.float64).reshape(-1, cls._array_size).tolist()]
 
 class ImageType:    
     Scene = 0
@@ -44,22 +136,29 @@ class LandedState:
     Landed = 0
     Flying = 1
 
-class Vector3r(MsgpackMixin):
-    x_val = np.float32(0)
-    y_val = np.float32(0)
-    z_val = np.float32(0)
+class Vector3r(SlotsMsgpackMixin):
+    __slots__ = ('x_val', 'y_val', 'z_val')
+    _field_defaults = {'x_val': np.float32(0), 'y_val': np.float32(0), 'z_val': np.float32(0)}
+    _array_size = 3
 
     def __init__(self, x_val = np.float32(0), y_val = np.float32(0), z_val = np.float32(0)):
         self.x_val = x_val
         self.y_val = y_val
         self.z_val = z_val
 
+    def _as_list(self):
+        return [self.x_val, self.y_val, self.z_val]
+
+    @classmethod
+    def _from_list(cls, values):
+        return cls(values[0], values[1], values[2])
 
-class Quaternionr(MsgpackMixin):
-    w_val = np.float32(0)
-    x_val = np.float32(0)
-    y_val = np.float32(0)
-    z_val = np.float32(0)
+
+class Quaternionr(SlotsMsgpackMixin):
+    # Fields are declared in (x, y, z, w) order, so that raw decoding yields the same order as the arrays
+    __slots__ = ('x_val', 'y_val', 'z_val', 'w_val')
+    _field_defaults = {'x_val': np.float32(0), 'y_val': np.float32(0), 'z_val': np.float32(0), 'w_val': np.float32(1)}
+    _array_size = 4
 
     def __init__(self, x_val = np.float32(0), y_val = np.float32(0), z_val = np.float32(0), w_val = np.float32(1)):
         self.x_val = x_val
@@ -67,21 +166,46 @@ class Quaternionr(MsgpackMixin):
         self.z_val = z_val
         self.w_val = w_val
 
-class Pose(MsgpackMixin):
-    position = Vector3r()
-    orientation = Quaternionr()
+    def _as_list(self):
+        return [self.x_val, self.y_val, self.z_val, self.w_val]
 
-    def __init__(self, position_val = Vector3r(), orientation_val = Quaternionr()):
-        self.position = position_val
-        self.orientation = orientation_val
+    @classmethod
+    def _from_list(cls, values):
+        return cls(values[0], values[1], values[2], values[3])
+
+class Pose(SlotsMsgpackMixin):
+    __slots__ = ('position', 'orientation')
+    _field_defaults = {'position': Vector3r(), 'orientation': Quaternionr()}
+    _array_size = 7
 
-class Twist(MsgpackMixin):
-    linear = Vector3r()
-    angular = Vector3r()
+    def __init__(self, position_val = None, orientation_val = None):
+        self.position = position_val if position_val is not None else Vector3r()
+        self.orientation = orientation_val if orientation_val is not None else Quaternionr()
 
-    def __init__(self, linear_val = Vector3r(), angular_val = Vector3r()):
-        self.linear = linear_val
-        self.angular = angular_val
+    # Arrays are position followed by orientation
+    def _as_list(self):
+        return self.position._as_list() + self.orientation._as_list()
+
+    @classmethod
+    def _from_list(cls, values):
+        return cls(Vector3r._from_list(values[0:3]), Quaternionr._from_list(values[3:7]))
+
+class Twist(SlotsMsgpackMixin):
+    __slots__ = ('linear', 'angular')
+    _field_defaults = {'linear': Vector3r(), 'angular': Vector3r()}
+    _array_size = 6
+
+    def __init__(self, linear_val = None, angular_val = None):
+        self.linear = linear_val if linear_val is not None else Vector3r()
+        self.angular = angular_val if angular_val is not None else Vector3r()
+
+    # Arrays are linear followed by angular
+    def _as_list(self):
+        return self.linear._as_list() + self.angular._as_list()
+
+    @classmethod
+    def _from_list(cls, values):
+        return cls(Vector3r._from_list(values[0:3]), Vector3r._from_list(values[3:6]))
 
 class CollisionInfo(MsgpackMixin):
     has_collided = False
@@ -187,13 +311,37 @@ class CarControls(MsgpackMixin):
             manual_gear = -1
             throttle = - abs(throttle_val)
 
-class KinematicsState(MsgpackMixin):
-    position = Vector3r()
-    orientation = Quaternionr()
-    linear_velocity = Vector3r()
-    angular_velocity = Vector3r()
-    linear_acceleration = Vector3r()
-    angular_acceleration = Vector3r()
+class KinematicsState(SlotsMsgpackMixin):
+    __slots__ = ('position', 'orientation', 'linear_velocity', 'angular_velocity', 'linear_acceleration', 'angular_acceleration')
+    _field_defaults = {'position': Vector3r(),
+                       'orientation': Quaternionr(),
+                       'linear_velocity': Vector3r(),
+                       'angular_velocity': Vector3r(),
+                       'linear_acceleration': Vector3r(),
+                       'angular_acceleration': Vector3r()}
+    _array_size = 19
+
+    def __init__(self, position = None, orientation = None, linear_velocity = None, angular_velocity = None, linear_acceleration = None, angular_acceleration = None):
+        self.position = position if position is not None else Vector3r()
+        self.orientation = orientation if orientation is not None else Quaternionr()
+        self.linear_velocity = linear_velocity if linear_velocity is not None else Vector3r()
+        self.angular_velocity = angular_velocity if angular_velocity is not None else Vector3r()
+        self.linear_acceleration = linear_acceleration if linear_acceleration is not None else Vector3r()
+        self.angular_acceleration = angular_acceleration if angular_acceleration is not None else Vector3r()
+
+    # Arrays are the fields in declaration order, with the orientation as (x, y, z, w)
+    def _as_list(self):
+        return (self.position._as_list() + self.orientation._as_list() + self.linear_velocity._as_list() + self.angular_velocity._as_list()
+                + self.linear_acceleration._as_list() + self.angular_acceleration._as_list())
+
+    @classmethod
+    def _from_list(cls, values):
+        return cls(Vector3r._from_list(values[0:3]),
+                   Quaternionr._from_list(values[3:7]),
+                   Vector3r._from_list(values[7:10]),
+                   Vector3r._from_list(values[10:13]),
+                   Vector3r._from_list(values[13:16]),
+                   Vector3r._from_list(values[16:19]))
 
 class EnvironmentState(MsgpackMixin):
     position = Vector3r()
@@ -9,56 +9,355 @@ import msgpack
 import time
 import math
 import logging
+import contextlib
+import threading
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+def _get_result_decoder(result_type, raw):
+    """ result_type is None for results that are returned as is, a MsgpackMixin type, or a one element list for a list of that type. """
+    if result_type is None:
+        return None
+    if isinstance(result_type, list):
+        decode_item = _get_result_decoder(result_type[0], raw)
+        return lambda results: [decode_item(result) for result in results]
+    if raw:
+        return result_type.from_msgpack_raw
+    return result_type.from_msgpack
+
+class RpcFuture:
+    """ Result of a call made in async mode or inside a batch.
+
+    The request is already on the wire when this object is created; get() waits for the response and decodes it.
+    on_done is called once the response has arrived.
+    """
+    def __init__(self, future, decoder = None, on_done = None):
+        self.future = future
+        self.decoder = decoder
+        self.on_done = on_done
+        self.is_resolved = False
+        self.result = None
+
+    def join(self):
+        self.future.join()
+        self.__done()
+
+    def get(self):
+        if not self.is_resolved:
+            try:
+                result = self.future.get()
+            finally:
+                self.__done()
+            if self.decoder is not None:
+                result = self.decoder(result)
+            self.result = result
+            self.is_resolved = True
+        return self.result
+
+    def __done(self):
+        if self.on_done is not None:
+            on_done = self.on_done
+            self.on_done = None
+            on_done()
+
+def resolve_result(result):
+    """ Returns the value of an API result, waiting for it if the call was made in async mode or inside a batch. """
+    if isinstance(result, RpcFuture):
+        return result.get()
+    return result
+
+class RpcBatch:
+    """ Collects the futures of the calls issued inside VehicleClient.batch() so they can be resolved together. """
+    def __init__(self):
+        self.futures = []
+
+    def add(self, future):
+        self.futures.append(future)
+        return future
+
+    def join(self):
+        for future in self.futures:
+            future.get()
+
+    def __len__(self):
+        return len(self.futures)
+
+class RpcConnection:
+    """ One msgpack-rpc connection of an RpcConnectionPool. client is replaced when the connection is re-established. """
+    def __init__(self, client):
+        self.client = client
+
+class RpcConnectionHold:
+    """ A connection that a thread holds on to while the futures of the *Async calls it made outside of async mode are pending. """
+    def __init__(self, pool):
+        self.pool = pool
+        self.connection = pool.acquire()
+        self.num_pending = 0
+
+    def call_async(self, method, args):
+        try:
+            future = self.connection.client.call_async(method, *args)
+        except Exception:
+            if self.num_pending == 0:
+                self.pool.release(self.connection)
+            raise
+        self.num_pending += 1
+        return RpcFuture(future, on_done = self.__on_done)
+
+    def __on_done(self):
+        self.num_pending -= 1
+        if self.num_pending == 0:
+            self.pool.release(self.connection)
+
+class RpcConnectionPool:
+    """ A fixed number of connections to one endpoint.
+
+    A msgpack-rpc client is not thread safe, so each connection is used by one thread at a time: checkout() hands out an
+    idle connection, waiting for one if all of them are in use.
+    """
+    def __init__(self, ip, port, size = 1, timeout_value = 60):
+        if size < 1:
+            raise ValueError('The connection pool needs at least one connection.')
+
+        self.address = msgpackrpc.Address(ip, port)
+        self.timeout_value = timeout_value
+        self.connections = [RpcConnection(self.connect()) for _ in range(size)]
+        self._idle_connections = queue.Queue()
+        for connection in self.connections:
+            self._idle_connections.put(connection)
+
+    def connect(self):
+        return msgpackrpc.Client(self.address, timeout = self.timeout_value, pack_encoding = 'utf-8', unpack_encoding = 'utf-8')
+
+    def acquire(self):
+        return self._idle_connections.get()
+
+    def release(self, connection):
+        self._idle_connections.put(connection)
+
+    @contextlib.contextmanager
+    def checkout(self):
+        connection = self.acquire()
+        try:
+            yield connection
+        finally:
+            self.release(connection)
 
 class VehicleClient:
-    def __init__(self, ip = "", port = 41451, timeout_value = 3600):
+    """ Client for the APIs common to all vehicles.
+
+    With pool_size > 1 the client can be shared by several threads: each synchronous call checks out one of pool_size
+    connections, and a thread in async mode or inside batch() holds on to one connection until it leaves that mode.
+    When a call fails because the connection broke or timed out, the connection is re-established up to
+    max_reconnect_attempts times, waiting reconnect_backoff seconds (doubling on each attempt) before each one. A
+    reconnect re-applies the last enableApiControl() of each vehicle. The call is then sent again, so calls that are
+    not safe to repeat should be left without reconnects.
+    timeout_value is the timeout of each call in seconds. Raise it for calls that take longer to complete, such as
+    joining the future of a long multirotor move.
+    """
+    def __init__(self, ip = "", port = 41451, timeout_value = 60, pool_size = 1, max_reconnect_attempts = 0, reconnect_backoff = 0.5):
         if (ip == ""):
             ip = "127.0.0.1"
-        self.client = msgpackrpc.Client(msgpackrpc.Address(ip, port), timeout = timeout_value, pack_encoding = 'utf-8', unpack_encoding = 'utf-8')
-        
+        self._pool = RpcConnectionPool(ip, port, pool_size, timeout_value)
+        self.max_reconnect_attempts = max_reconnect_attempts
+        self.reconnect_backoff = reconnect_backoff
+        self.reconnect_count = 0
+        self._api_control = {}
+        self._raw_decoding = False
+
+        # The async mode, the current batch and the connection held for them are per thread
+        self._local = threading.local()
+
+    @property
+    def client(self):
+        """ The msgpack-rpc client of the connection held by this thread, or of the first connection of the pool. """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            hold = self.__get_hold()
+            connection = hold.connection if hold is not None else self._pool.connections[0]
+        return connection.client
+
+    # -----------------------------------  Request pipelining ---------------------------------------------
+    def _call(self, result_type, method, *args):
+        decoder = _get_result_decoder(result_type, self._raw_decoding)
+        connection = getattr(self._local, 'connection', None)
+        if (connection is None):
+            result = self._call_with_reconnect(method, args)
+            if decoder is not None:
+                return decoder(result)
+            return result
+
+        future = RpcFuture(connection.client.call_async(method, *args), decoder)
+        batch = getattr(self._local, 'batch', None)
+        if (batch is not None):
+            batch.add(future)
+        return future
+
+    def _call_async(self, method, *args):
+        """ Returns an RpcFuture whatever the mode, for the *Async APIs that only respond once the vehicle has carried them out.
+
+        Outside of async mode and batches, the thread holds the connection the call was made on until all such futures
+        are resolved, and makes its other calls on that connection meanwhile. Join them before enabling async mode or
+        entering a batch.
+        """
+        if (getattr(self._local, 'connection', None) is not None):
+            return self._call(None, method, *args)
+
+        hold = self.__get_hold()
+        if (hold is None):
+            hold = RpcConnectionHold(self._pool)
+            self._local.hold = hold
+        return hold.call_async(method, args)
+
+    def _call_sync(self, method, *args):
+        """ Waits for the response even in async mode or inside a batch. """
+        connection = getattr(self._local, 'connection', None)
+        if (connection is not None):
+            return connection.client.call(method, *args)
+        return self._call_with_reconnect(method, args)
+
+    def _call_with_reconnect(self, method, args):
+        hold = self.__get_hold()
+        if (hold is not None):
+            # Not reconnected, which would drop the pending calls
+            return hold.connection.client.call(method, *args)
+
+        with self._pool.checkout() as connection:
+            num_attempts = 0
+            while True:
+                try:
+                    if num_attempts > 0:
+                        self.__reconnect(connection)
+                    return connection.client.call(method, *args)
+                except (msgpackrpc.error.TransportError, msgpackrpc.error.TimeoutError):
+                    if num_attempts >= self.max_reconnect_attempts:
+                        raise
+                    time.sleep(self.reconnect_backoff * (2 ** num_attempts))
+                    num_attempts += 1
+
+    def __get_hold(self):
+        hold = getattr(self._local, 'hold', None)
+        if (hold is None or hold.num_pending == 0):
+            return None
+        return hold
+
+    def __reconnect(self, connection):
+        logging.warning('Reconnecting to %s:%s.', self._pool.address.host, self._pool.address.port)
+        self.reconnect_count += 1
+        connection.client.close()
+        connection.client = self._pool.connect()
+        for vehicle_name, is_enabled in list(self._api_control.items()):
+            connection.client.call('enableApiControl', is_enabled, vehicle_name)
+
+    def enableAsyncMode(self, is_enabled):
+        """ When enabled, every API call made by this thread sends its request and immediately returns an RpcFuture instead of waiting for the response.
+
+        The thread holds one connection of the pool while async mode is enabled. Get the pending futures before disabling it.
+        """
+        if is_enabled == self.isAsyncModeEnabled():
+            return
+
+        self._local.async_mode = is_enabled
+        if (getattr(self._local, 'batch', None) is not None):
+            # The batch holds a connection already, and keeps it or releases it on exit depending on the async mode
+            return
+        if is_enabled:
+            self._local.connection = self._pool.acquire()
+        else:
+            self._pool.release(self._local.connection)
+            self._local.connection = None
+
+    def isAsyncModeEnabled(self):
+        return getattr(self._local, 'async_mode', False)
+
+    @contextlib.contextmanager
+    def batch(self):
+        """ Pipeline every API call made inside the block on this connection.
+
+        Calls return RpcFuture objects; all of them are resolved when the block exits, so the block costs about one round trip.
+
+            with client.batch():
+                pose = client.simGetVehiclePose()
+                collision_info = client.simGetCollisionInfo()
+            print(pose.get().position, collision_info.get().has_collided)
+        """
+        if (getattr(self._local, 'batch', None) is not None):
+            # Nested batches are folded into the outermost one
+            yield self._local.batch
+            return
+
+        if (getattr(self._local, 'connection', None) is None):
+            self._local.connection = self._pool.acquire()
+        self._local.batch = RpcBatch()
+        try:
+            yield self._local.batch
+            self._local.batch.join()
+        finally:
+            self._local.batch = None
+            # Outside of a batch, the thread only holds a connection while it is in async mode
+            if not self.isAsyncModeEnabled():
+                self._pool.release(self._local.connection)
+                self._local.connection = None
+
+    def enableRawDecoding(self, is_enabled):
+        """ When enabled, structured results are decoded to plain tuples of their field values instead of objects.
+
+        The field order of each type is given by its msgpack_fields(), e.g. Pose.msgpack_fields() is ('position', 'orientation').
+        Decoding to tuples is cheaper, and a field of a run of results converts directly with numpy.array().
+        """
+        self._raw_decoding = is_enabled
+
+    def isRawDecodingEnabled(self):
+        return self._raw_decoding
+
     # -----------------------------------  Common vehicle APIs ---------------------------------------------
     def reset(self):
-        self.client.call('reset')
+        return self._call(None, 'reset')
 
     def ping(self):
-        return self.client.call('ping')
+        return self._call(None, 'ping')
 
     def getClientVersion(self):
         return 1 # sync with C++ client
     def getServerVersion(self):
-        return self.client.call('getServerVersion')
+        return self._call(None, 'getServerVersion')
     def getMinRequiredServerVersion(self):
         return 1 # sync with C++ client
     def getMinRequiredClientVersion(self):
-        return self.client.call('getMinRequiredClientVersion')
+        return self._call(None, 'getMinRequiredClientVersion')
 
     # basic flight control
     def enableApiControl(self, is_enabled, vehicle_name = ''):
-        return self.client.call('enableApiControl', is_enabled, vehicle_name)
+        # Remembered so that a reconnect can restore it
+        self._api_control[vehicle_name] = is_enabled
+        return self._call(None, 'enableApiControl', is_enabled, vehicle_name)
     def isApiControlEnabled(self, vehicle_name = ''):
-        return self.client.call('isApiControlEnabled', vehicle_name)
+        return self._call(None, 'isApiControlEnabled', vehicle_name)
     def armDisarm(self, arm, vehicle_name = ''):
-        return self.client.call('armDisarm', arm, vehicle_name)
+        return self._call(None, 'armDisarm', arm, vehicle_name)
  
     def simPause(self, is_paused):
-        self.client.call('simPause', is_paused)
+        return self._call(None, 'simPause', is_paused)
     def simIsPause(self):
-        return self.client.call("simIsPaused")
+        return self._call(None, "simIsPaused")
     def simContinueForTime(self, seconds):
-        self.client.call('simContinueForTime', seconds)
+        return self._call(None, 'simContinueForTime', seconds)
 
     def getHomeGeoPoint(self, vehicle_name = ''):
-        return GeoPoint.from_msgpack(self.client.call('getHomeGeoPoint', vehicle_name))
+        return self._call(GeoPoint, 'getHomeGeoPoint', vehicle_name)
 
     def confirmConnection(self):
-        if self.ping():
+        # The results are compared below, so they are waited for even in async mode
+        if self._call_sync('ping'):
             print("Connected!")
         else:
              print("Ping returned false!")
-        server_ver = self.getServerVersion()
+        server_ver = self._call_sync('getServerVersion')
         client_ver = self.getClientVersion()
         server_min_ver = self.getMinRequiredServerVersion()
-        client_min_ver = self.getMinRequiredClientVersion()
+        client_min_ver = self._call_sync('getMinRequiredClientVersion')
     
         ver_info = "Client Ver:" + str(client_ver) + " (Min Req: " + str(client_min_ver) + \
               "), Server Ver:" + str(server_ver) + " (Min Req: " + str(server_min_ver) + ")"
@@ -81,7 +380,7 @@ class VehicleClient:
         camera_name = str(camera_name)
 
         # because this method returns std::vector<uint8>, msgpack decides to encode it as a string unfortunately.
-        result = self.client.call('simGetImage', camera_name, image_type, vehicle_name)
+        result = self._call_sync('simGetImage', camera_name, image_type, vehicle_name)
         if (result == "" or result == "\0"):
             return None
         return result
@@ -90,22 +389,19 @@ class VehicleClient:
     # simGetImage returns compressed png in array of bytes
     # image_type uses one of the ImageType members
     def simGetImages(self, requests, vehicle_name = ''):
-        responses_raw = self.client.call('simGetImages', requests, vehicle_name)
-        return [ImageResponse.from_msgpack(response_raw) for response_raw in responses_raw]
+        return self._call([ImageResponse], 'simGetImages', requests, vehicle_name)
 
     def simSetCameraPose(self, camera_pose_obj, vehicle_name = ''):
-        self.client.call('simSetCameraPose', camera_pose_obj, vehicle_name)
+        return self._call(None, 'simSetCameraPose', camera_pose_obj, vehicle_name)
 
     def readSensors(self, vehicle_name = ''):
-        responses_raw = self.client.call('readSensors', vehicle_name)
-        return responses_raw
+        return self._call(None, 'readSensors', vehicle_name)
 
     def simRayCast(self, ray_cast_request, vehicle_name = ''):
-        response = self.client.call('simRayCast', ray_cast_request, vehicle_name)
-        return response
+        return self._call(None, 'simRayCast', ray_cast_request, vehicle_name)
 
     def simSetDrawableShapes(self, request, vehicle_name = ''):
-        self.client.call('simSetDrawableShapes', request, vehicle_name)
+        return self._call(None, 'simSetDrawableShapes', request, vehicle_name)
 
     def addDrawableShapePoint(self, request, shape_name, reference_frame_link, x, y, z, size, color_r, color_g, color_b, color_a):
         shape_params = [x, y, z, size, color_r, color_g, color_b, color_a]
@@ -143,92 +439,88 @@ class VehicleClient:
         return request
 
     def simGetCollisionInfo(self, vehicle_name = ''):
-        return CollisionInfo.from_msgpack(self.client.call('simGetCollisionInfo', vehicle_name))
+        return self._call(CollisionInfo, 'simGetCollisionInfo', vehicle_name)
 
     def simXyzToGeoPoints(self, geo_points, vehicle_name = ''):
-        return self.client.call('simXyzToGeoPoints', geo_points, vehicle_name)
+        return self._call(None, 'simXyzToGeoPoints', geo_points, vehicle_name)
 
     def simSetVehiclePose(self, pose, ignore_collison, vehicle_name = ''):
-        self.client.call('simSetVehiclePose', pose, ignore_collison, vehicle_name)
+        return self._call(None, 'simSetVehiclePose', pose, ignore_collison, vehicle_name)
     def simGetVehiclePose(self, vehicle_name = ''):
-        pose = self.client.call('simGetVehiclePose', vehicle_name)
-        return Pose.from_msgpack(pose)
+        return self._call(Pose, 'simGetVehiclePose', vehicle_name)
     def simGetObjectPose(self, object_name):
-        pose = self.client.call('simGetObjectPose', object_name)
-        return Pose.from_msgpack(pose)
+        return self._call(Pose, 'simGetObjectPose', object_name)
     def simSetObjectPose(self, object_name, pose, teleport = True):
-        return self.client.call('simSetObjectPose', object_name, pose, teleport)
+        return self._call(None, 'simSetObjectPose', object_name, pose, teleport)
 
     def simSpawnStaticMeshObject(self, object_class_name, object_name, pose):
-        return self.client.call('simSpawnStaticMeshObject', object_class_name, object_name, pose)
+        return self._call(None, 'simSpawnStaticMeshObject', object_class_name, object_name, pose)
     def simDeleteObject(self, object_name):
-        return self.client.call('simDeleteObject', object_name)
+        return self._call(None, 'simDeleteObject', object_name)
 
     def simSetSegmentationObjectID(self, mesh_name, object_id, is_name_regex = False):
-        return self.client.call('simSetSegmentationObjectID', mesh_name, object_id, is_name_regex)
+        return self._call(None, 'simSetSegmentationObjectID', mesh_name, object_id, is_name_regex)
     def simGetSegmentationObjectID(self, mesh_name):
-        return self.client.call('simGetSegmentationObjectID', mesh_name)
+        return self._call(None, 'simGetSegmentationObjectID', mesh_name)
     def simPrintLogMessage(self, message, message_param = "", severity = 0):
-        return self.client.call('simPrintLogMessage', message, message_param, severity)
+        return self._call(None, 'simPrintLogMessage', message, message_param, severity)
 
     def simGetCameraInfo(self, camera_name, vehicle_name = ''):
         # TODO: below str() conversion is only needed for legacy reason and should be removed in future
-        return CameraInfo.from_msgpack(self.client.call('simGetCameraInfo', str(camera_name), vehicle_name))
+        return self._call(CameraInfo, 'simGetCameraInfo', str(camera_name), vehicle_name)
     def simSetCameraOrientation(self, camera_name, orientation, vehicle_name = ''):
         # TODO: below str() conversion is only needed for legacy reason and should be removed in future
-        self.client.call('simSetCameraOrientation', str(camera_name), orientation, vehicle_name)
+        return self._call(None, 'simSetCameraOrientation', str(camera_name), orientation, vehicle_name)
 
     def simGetGroundTruthKinematics(self, vehicle_name = ''):
-        kinematics_state = self.client.call('simGetGroundTruthKinematics', vehicle_name)
-        return KinematicsState.from_msgpack(kinematics_state)
+        return self._call(KinematicsState, 'simGetGroundTruthKinematics', vehicle_name)
     simGetGroundTruthKinematics.__annotations__ = {'return': KinematicsState}
     def simGetGroundTruthEnvironment(self, vehicle_name = ''):
-        env_state = self.client.call('simGetGroundTruthEnvironment', vehicle_name)
-        return EnvironmentState.from_msgpack(env_state)
+        return self._call(EnvironmentState, 'simGetGroundTruthEnvironment', vehicle_name)
     simGetGroundTruthEnvironment.__annotations__ = {'return': EnvironmentState}
 
     # lidar APIs
     def getLidarData(self, lidar_name = '', vehicle_name = ''):
-        return LidarData.from_msgpack(self.client.call('getLidarData', lidar_name, vehicle_name))
+        return self._call(LidarData, 'getLidarData', lidar_name, vehicle_name)
 
     #----------- APIs to control ACharacter in scene ----------/
     def simCharSetFaceExpression(self, expression_name, value, character_name = ""):
-        self.client.call('simCharSetFaceExpression', expression_name, value, character_name)
+        return self._call(None, 'simCharSetFaceExpression', expression_name, value, character_name)
     def simCharGetFaceExpression(self, expression_name, character_name = ""):
-        return self.client.call('simCharGetFaceExpression', expression_name, character_name)
+        return self._call(None, 'simCharGetFaceExpression', expression_name, character_name)
     def simCharGetAvailableFaceExpressions(self):
-        return self.client.call('simCharGetAvailableFaceExpressions')
+        return self._call(None, 'simCharGetAvailableFaceExpressions')
     def simCharSetSkinDarkness(self, value, character_name = ""):
-        self.client.call('simCharSetSkinDarkness', value, character_name)
+        return self._call(None, 'simCharSetSkinDarkness', value, character_name)
     def simCharGetSkinDarkness(self, character_name = ""):
-        return self.client.call('simCharGetSkinDarkness', character_name)
+        return self._call(None, 'simCharGetSkinDarkness', character_name)
     def simCharSetSkinAgeing(self, value, character_name = ""):
-        self.client.call('simCharSetSkinAgeing', value, character_name)
+        return self._call(None, 'simCharSetSkinAgeing', value, character_name)
     def simCharGetSkinAgeing(self, character_name = ""):
-        return self.client.call('simCharGetSkinAgeing', character_name)
+        return self._call(None, 'simCharGetSkinAgeing', character_name)
     def simCharSetHeadRotation(self, q, character_name = ""):
-        self.client.call('simCharSetHeadRotation', q, character_name)
+        return self._call(None, 'simCharSetHeadRotation', q, character_name)
     def simCharGetHeadRotation(self, character_name = ""):
-        return self.client.call('simCharGetHeadRotation', character_name)
+        return self._call(None, 'simCharGetHeadRotation', character_name)
     def simCharSetBonePose(self, bone_name, pose, character_name = ""):
-        self.client.call('simCharSetBonePose', bone_name, pose, character_name)
+        return self._call(None, 'simCharSetBonePose', bone_name, pose, character_name)
     def simCharGetBonePose(self, bone_name, character_name = ""):
-        return self.client.call('simCharGetBonePose', bone_name, character_name)
+        return self._call(None, 'simCharGetBonePose', bone_name, character_name)
     def simCharResetBonePose(self, bone_name, character_name = ""):
-        self.client.call('simCharResetBonePose', bone_name, character_name)
+        return self._call(None, 'simCharResetBonePose', bone_name, character_name)
     def simCharSetFacePreset(self, preset_name, value, character_name = ""):
-        self.client.call('simCharSetFacePreset', preset_name, value, character_name)
+        return self._call(None, 'simCharSetFacePreset', preset_name, value, character_name)
     def simCharSetFacePresets(self, presets, character_name = ""):
-        self.client.call('simSetFacePresets', presets, character_name)
+        return self._call(None, 'simSetFacePresets', presets, character_name)
     def simCharSetBonePoses(self, poses, character_name = ""):
-        self.client.call('simSetBonePoses', poses, character_name)
+        return self._call(None, 'simSetBonePoses', poses, character_name)
     def simCharGetBonePoses(self, bone_names, character_name = ""):
-        return self.client.call('simGetBonePoses', bone_names, character_name)
+        return self._call(None, 'simGetBonePoses', bone_names, character_name)
 
     def cancelLastTask():
-        self.client.call('cancelLastTask')
+        self._call_sync('cancelLastTask')
     def waitOnLastTask(timeout_sec = float('nan')):
-        return self.client.call('waitOnLastTask', timeout_sec)
+        return self._call_sync('waitOnLastTask', timeout_sec)
 
     # legacy handling
     # TODO: remove below legacy wrappers in future major releases
@@ -295,33 +587,33 @@ class VehicleClient:
 
 # -----------------------------------  Multirotor APIs ---------------------------------------------
 class MultirotorClient(VehicleClient, object):
-    def __init__(self, ip = "", port = 41451, timeout_value = 3600):
-        super(MultirotorClient, self).__init__(ip, port, timeout_value)
+    def __init__(self, ip = "", port = 41451, timeout_value = 60, pool_size = 1, max_reconnect_attempts = 0, reconnect_backoff = 0.5):
+        super(MultirotorClient, self).__init__(ip, port, timeout_value, pool_size, max_reconnect_attempts, reconnect_backoff)
 
     def takeoffAsync(self, timeout_sec = 20, vehicle_name = ''):
-        return self.client.call_async('takeoff', timeout_sec, vehicle_name)  
+        return self._call_async('takeoff', timeout_sec, vehicle_name)  
     def landAsync(self, timeout_sec = 60, vehicle_name = ''):
-        return self.client.call_async('land', timeout_sec, vehicle_name)   
+        return self._call_async('land', timeout_sec, vehicle_name)   
     def goHomeAsync(self, timeout_sec = 3e+38, vehicle_name = ''):
-        return self.client.call_async('goHome', timeout_sec, vehicle_name)
+        return self._call_async('goHome', timeout_sec, vehicle_name)
 
     # APIs for control
     def moveByAngleZAsync(self, pitch, roll, z, yaw, duration, vehicle_name = ''):
-        return self.client.call_async('moveByAngleZ', pitch, roll, z, yaw, duration, vehicle_name)
+        return self._call_async('moveByAngleZ', pitch, roll, z, yaw, duration, vehicle_name)
     def moveByAngleThrottleAsync(self, pitch, roll, throttle, yaw_rate, duration, vehicle_name = ''):
-        return self.client.call_async('moveByAngleThrottle', pitch, roll, throttle, yaw_rate, duration, vehicle_name)
+        return self._call_async('moveByAngleThrottle', pitch, roll, throttle, yaw_rate, duration, vehicle_name)
     def moveByVelocityAsync(self, vx, vy, vz, duration, drivetrain = DrivetrainType.MaxDegreeOfFreedom, yaw_mode = YawMode(), vehicle_name = ''):
-        return self.client.call_async('moveByVelocity', vx, vy, vz, duration, drivetrain, yaw_mode, vehicle_name)
+        return self._call_async('moveByVelocity', vx, vy, vz, duration, drivetrain, yaw_mode, vehicle_name)
     def moveByVelocityZAsync(self, vx, vy, z, duration, drivetrain = DrivetrainType.MaxDegreeOfFreedom, yaw_mode = YawMode(), vehicle_name = ''):
-        return self.client.call_async('moveByVelocityZ', vx, vy, z, duration, drivetrain, yaw_mode, vehicle_name)
+        return self._call_async('moveByVelocityZ', vx, vy, z, duration, drivetrain, yaw_mode, vehicle_name)
     def moveOnPathAsync(self, path, velocity, timeout_sec = 3e+38, drivetrain = DrivetrainType.MaxDegreeOfFreedom, yaw_mode = YawMode(), 
         lookahead = -1, adaptive_lookahead = 1, vehicle_name = ''):
-        return self.client.call_async('moveOnPath', path, velocity, timeout_sec, drivetrain, yaw_mode, lookahead, adaptive_lookahead, vehicle_name)
+        return self._call_async('moveOnPath', path, velocity, timeout_sec, drivetrain, yaw_mode, lookahead, adaptive_lookahead, vehicle_name)
     def moveToPositionAsync(self, x, y, z, velocity, timeout_sec = 3e+38, drivetrain = DrivetrainType.MaxDegreeOfFreedom, yaw_mode = YawMode(), 
         lookahead = -1, adaptive_lookahead = 1, vehicle_name = ''):
-        return self.client.call_async('moveToPosition', x, y, z, velocity, timeout_sec, drivetrain, yaw_mode, lookahead, adaptive_lookahead, vehicle_name)
+        return self._call_async('moveToPosition', x, y, z, velocity, timeout_sec, drivetrain, yaw_mode, lookahead, adaptive_lookahead, vehicle_name)
     def moveToZAsync(self, z, velocity, timeout_sec = 3e+38, yaw_mode = YawMode(), lookahead = -1, adaptive_lookahead = 1, vehicle_name = ''):
-        return self.client.call_async('moveToZ', z, velocity, timeout_sec, yaw_mode, lookahead, adaptive_lookahead, vehicle_name)
+        return self._call_async('moveToZ', z, velocity, timeout_sec, yaw_mode, lookahead, adaptive_lookahead, vehicle_name)
     def moveByManualAsync(self, vx_max, vy_max, z_min, duration, drivetrain = DrivetrainType.MaxDegreeOfFreedom, yaw_mode = YawMode(), vehicle_name = ''):
         """Read current RC state and use it to control the vehicles. 
 
@@ -336,53 +628,51 @@ class MultirotorClient(VehicleClient, object):
         :param drivetrain: when ForwardOnly, vehicle rotates itself so that its front is always facing the direction of travel. If MaxDegreeOfFreedom then it doesn't do that (crab-like movement)
         :param yaw_mode: Specifies if vehicle should face at given angle (is_rate=False) or should be rotating around its axis at given rate (is_rate=True)
         """
-        return self.client.call_async('moveByManual', vx_max, vy_max, z_min, duration, drivetrain, yaw_mode, vehicle_name)
+        return self._call_async('moveByManual', vx_max, vy_max, z_min, duration, drivetrain, yaw_mode, vehicle_name)
     def rotateToYawAsync(self, yaw, timeout_sec = 3e+38, margin = 5, vehicle_name = ''):
-        return self.client.call_async('rotateToYaw', yaw, timeout_sec, margin, vehicle_name)
+        return self._call_async('rotateToYaw', yaw, timeout_sec, margin, vehicle_name)
     def rotateByYawRateAsync(self, yaw_rate, duration, vehicle_name = ''):
-        return self.client.call_async('rotateByYawRate', yaw_rate, duration, vehicle_name)
+        return self._call_async('rotateByYawRate', yaw_rate, duration, vehicle_name)
     def hoverAsync(self, vehicle_name = ''):
-        return self.client.call_async('hover', vehicle_name)
+        return self._call_async('hover', vehicle_name)
 
     def moveByRC(self, rcdata = RCData(), vehicle_name = ''):
-        return self.client.call('moveByRC', rcdata, vehicle_name)
+        return self._call(None, 'moveByRC', rcdata, vehicle_name)
         
     # query vehicle state
     def getMultirotorState(self, vehicle_name = ''):
-        return MultirotorState.from_msgpack(self.client.call('getMultirotorState', vehicle_name))
+        return self._call(MultirotorState, 'getMultirotorState', vehicle_name)
     getMultirotorState.__annotations__ = {'return': MultirotorState}
 
 
 # -----------------------------------  Car APIs ---------------------------------------------
 class CarClient(VehicleClient, object):
-    def __init__(self, ip = "", port = 41451, timeout_value = 3600):
-        super(CarClient, self).__init__(ip, port, timeout_value)
+    def __init__(self, ip = "", port = 41451, timeout_value = 60, pool_size = 1, max_reconnect_attempts = 0, reconnect_backoff = 0.5):
+        super(CarClient, self).__init__(ip, port, timeout_value, pool_size, max_reconnect_attempts, reconnect_backoff)
 
     def setCarControls(self, controls, vehicle_name = ''):
-        self.client.call('setCarControls', controls, vehicle_name)
+        return self._call(None, 'setCarControls', controls, vehicle_name)
 
     def getCarState(self, vehicle_name = ''):
-        state_raw = self.client.call('getCarState', vehicle_name)
-        return CarState.from_msgpack(state_raw)
+        return self._call(CarState, 'getCarState', vehicle_name)
 
 # -----------------------------------  UrdfBot APIs ---------------------------------------------
 class UrdfBotClient(VehicleClient, object):
-    def __init__(self):
-        super(UrdfBotClient, self).__init__()
+    def __init__(self, ip = "", port = 41451, timeout_value = 60, pool_size = 1, max_reconnect_attempts = 0, reconnect_backoff = 0.5):
+        super(UrdfBotClient, self).__init__(ip, port, timeout_value, pool_size, max_reconnect_attempts, reconnect_backoff)
 
     def addAngularForce(self, add_angular_force_obj, vehicle_name = ''):
-        self.client.call('addAngularForce', add_angular_force_obj, vehicle_name)
+        return self._call(None, 'addAngularForce', add_angular_force_obj, vehicle_name)
 
     def addLinearForce(self, add_linear_force_obj, vehicle_name = ''):
-        self.client.call('addLinearForce', add_linear_force_obj, vehicle_name)
+        return self._call(None, 'addLinearForce', add_linear_force_obj, vehicle_name)
 
     def updateForceMagnitude(self, update_force_magnitude_obj, vehicle_name = ''):
-        self.client.call('updateForceMagnitude', update_force_magnitude_obj, vehicle_name)
+        return self._call(None, 'updateForceMagnitude', update_force_magnitude_obj, vehicle_name)
 
     def updateControlledMotionComponentControlSignal(self, update_controlled_motion_component_control_signal_obj, vehicle_name=''):
-        self.client.call('updateControlledMotionComponentControlSignal', update_controlled_motion_component_control_signal_obj, vehicle_name)
+        return self._call(None, 'updateControlledMotionComponentControlSignal', update_controlled_motion_component_control_signal_obj, vehicle_name)
 
     def getUrdfBotState(self, vehicle_name = ''):
-        state_raw = self.client.call('getUrdfBotState', vehicle_name)
-        return UrdfBotState.from_msgpack(state_raw)
+        return self._call(UrdfBotState, 'getUrdfBotState', vehicle_name)
 
@@ -1,66 +1,77 @@
-import numpy as np
-import matplotlib.pyplot as plt
-import re
+import glob
+import os
 import sys
-import pdb
-
 
-def read_pfm(file):
-    """ Read a pfm file """
-    file = open(file, 'rb')
+import numpy as np
 
-    color = None
-    width = None
-    height = None
-    scale = None
-    endian = None
+class PfmHeader:
+    """ The header of a PFM file. data_offset is the byte offset of the pixel data in the file. """
+    def __init__(self, width, height, color, scale, endian, data_offset):
+        self.width = width
+        self.height = height
+        self.color = color
+        self.scale = scale
+        self.endian = endian
+        self.data_offset = data_offset
+
+    @property
+    def shape(self):
+        return (self.height, self.width, 3) if self.color else (self.height, self.width)
+
+    @property
+    def dtype(self):
+        return np.dtype(self.endian + 'f')
+
+def read_pfm_header(file):
+    """ Reads only the header of a pfm file, without touching the pixel data """
+    with open(file, 'rb') as pfm_file:
+        header = pfm_file.readline().rstrip()
+        if header == b'PF':
+            color = True
+        elif header == b'Pf':
+            color = False
+        else:
+            raise Exception('Not a PFM file.')
 
-    header = file.readline().rstrip()
-    header = str(bytes.decode(header, encoding='utf-8'))
-    if header == 'PF':
-        color = True
-    elif header == 'Pf':
-        color = False
-    else:
-        raise Exception('Not a PFM file.')
+        # Some writers put the width and the height on separate lines
+        dims = pfm_file.readline().split()
+        if len(dims) == 1:
+            dims += pfm_file.readline().split()
+        if len(dims) != 2 or not dims[0].isdigit() or not dims[1].isdigit():
+            raise Exception('Malformed PFM header: width, height cannot be found')
+        width, height = int(dims[0]), int(dims[1])
 
-    pattern = r'^(\d+)\s(\d+)\s$'
-    temp_str = str(bytes.decode(file.readline(), encoding='utf-8'))
-    dim_match = re.match(pattern, temp_str)
-    if dim_match:
-        width, height = map(int, dim_match.groups())
-    else:
-        temp_str += str(bytes.decode(file.readline(), encoding='utf-8'))
-        dim_match = re.match(pattern, temp_str)
-        if dim_match:
-            width, height = map(int, dim_match.groups())
+        scale = float(pfm_file.readline().rstrip())
+        if scale < 0: # little-endian
+            endian = '<'
+            scale = -scale
         else:
-            raise Exception('Malformed PFM header: width, height cannot be found')
+            endian = '>' # big-endian
 
-    scale = float(file.readline().rstrip())
-    if scale < 0: # little-endian
-        endian = '<'
-        scale = -scale
-    else:
-        endian = '>' # big-endian
+        return PfmHeader(width, height, color, scale, endian, pfm_file.tell())
+
+def read_pfm(file, mmap = False):
+    """ Read a pfm file
+
+    With mmap=True, the data is a read-only np.memmap over the file, so only the pixels that are accessed are read from disk.
+    """
+    header = read_pfm_header(file)
 
-    data = np.fromfile(file, endian + 'f')
-    shape = (height, width, 3) if color else (height, width)
+    if mmap:
+        data = np.memmap(file, dtype = header.dtype, mode = 'r', offset = header.data_offset, shape = header.shape)
+    else:
+        with open(file, 'rb') as pfm_file:
+            pfm_file.seek(header.data_offset)
+            data = np.fromfile(pfm_file, header.dtype, count = int(np.prod(header.shape)))
+        data = np.reshape(data, header.shape)
 
-    data = np.reshape(data, shape)
     # DEY: I don't know why this was there.
     #data = np.flipud(data)
-    file.close()
-    
-    return data, scale
 
+    return data, header.scale
 
 def write_pfm(file, image, scale=1):
     """ Write a pfm file """
-    file = open(file, 'wb')
-
-    color = None
-
     if image.dtype.name != 'float32':
         raise Exception('Image dtype must be float32.')
 
@@ -73,16 +84,34 @@ def write_pfm(file, image, scale=1):
     else:
         raise Exception('Image must have H x W x 3, H x W x 1 or H x W dimensions.')
 
-    file.write(bytes('PF\n', 'UTF-8') if color else bytes('Pf\n', 'UTF-8'))
-    temp_str = '%d %d\n' % (image.shape[1], image.shape[0])
-    file.write(bytes(temp_str, 'UTF-8'))
-
     endian = image.dtype.byteorder
 
     if endian == '<' or endian == '=' and sys.byteorder == 'little':
         scale = -scale
 
-    temp_str = '%f\n' % scale
-    file.write(bytes(temp_str, 'UTF-8'))
+    with open(file, 'wb') as pfm_file:
+        pfm_file.write(b'PF\n' if color else b'Pf\n')
+        pfm_file.write(('%d %d\n' % (image.shape[1], image.shape[0])).encode('utf-8'))
+        pfm_file.write(('%f\n' % scale).encode('utf-8'))
+        image.tofile(pfm_file)
+
+def list_pfm_files(directory):
+    return sorted(glob.glob(os.path.join(directory, '*.pfm')))
+
+def read_pfm_directory(directory, mmap = True):
+    """ Returns a (path, data, scale) tuple for every pfm file in the directory, in name order.
+
+    With the default mmap=True only the headers are read here, so a large recorded dataset can be scanned cheaply.
+    """
+    return [(path,) + read_pfm(path, mmap) for path in list_pfm_files(directory)]
+
+def iter_pfm_batches(directory, batch_size = 16):
+    """ Yields (paths, images) for the pfm files in the directory, in name order.
 
-    image.tofile(file)
+    images stacks batch_size frames into one (N, H, W) or (N, H, W, 3) array, so only one batch is in memory at a time.
+    All the files must have the same dimensions.
+    """
+    paths = list_pfm_files(directory)
+    for batch_start in range(0, len(paths), batch_size):
+        batch_paths = paths[batch_start:batch_start + batch_size]
+        yield batch_paths, np.stack([read_pfm(path, mmap = True)[0] for path in batch_paths])
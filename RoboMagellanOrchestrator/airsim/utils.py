@@ -8,20 +8,51 @@ import types
 import re
 
 from .airsim_types import *
+from .pfm import read_pfm, write_pfm
 
 
 def string_to_uint8_array(bstr):
-    return np.fromstring(bstr, np.uint8)
+    """ Returns a read-only view over bstr; copy() it to modify the pixels.
+
+    Servers that pack the image as a msgpack string instead of binary data arrive here as str, which has to be encoded back to bytes first.
+    """
+    if isinstance(bstr, str):
+        bstr = bstr.encode('utf-8')
+    return np.frombuffer(bstr, np.uint8)
     
 def string_to_float_array(bstr):
-    return np.fromstring(bstr, np.float32)
+    """ Returns a read-only view over bstr; copy() it to modify the values. """
+    return np.frombuffer(bstr, np.float32)
     
 def list_to_2d_float_array(flst, width, height):
-    return np.reshape(np.asarray(flst, np.float32), (height, width))
+    return np.reshape(_to_float_array(flst, width * height), (height, width))
     
 def get_pfm_array(response):
     return list_to_2d_float_array(response.image_data_float, response.width, response.height)
 
+def get_image_array(response):
+    """ Returns the pixels of an uncompressed ImageResponse as an (H, W, C) array.
+
+    Byte images are a read-only view over the received buffer. Float images are (H, W, 1) float32, decoded straight from the
+    buffer when the server sends them as bytes, and from the list of floats in a single pass otherwise.
+    """
+    if response.compress:
+        raise ValueError('get_image_array() needs an uncompressed image. Request it with compress=False, or decode the PNG bytes.')
+
+    if response.pixels_as_float:
+        return list_to_2d_float_array(response.image_data_float, response.width, response.height).reshape(response.height, response.width, 1)
+
+    pixels = string_to_uint8_array(response.image_data_uint8)
+    num_pixels = response.width * response.height
+    if num_pixels == 0 or pixels.shape[0] % num_pixels != 0:
+        raise ValueError('Image data of {0} bytes does not match a {1}x{2} image.'.format(pixels.shape[0], response.width, response.height))
+    return pixels.reshape(response.height, response.width, pixels.shape[0] // num_pixels)
+
+def _to_float_array(values, count):
+    if isinstance(values, (bytes, bytearray, memoryview)):
+        return np.frombuffer(values, np.float32, count=count)
+    return np.fromiter(values, np.float32, count=count)
+
     
 def get_public_fields(obj):
     return [attr for attr in dir(obj)
@@ -90,6 +121,44 @@ def to_quaternion(pitch, roll, yaw):
     q.z_val = t1 * t2 * t4 - t0 * t3 * t5 #z
     return q
 
+
+# Vectorized versions of to_eularian_angles and to_quaternion, with the same convention: angles are in radians and
+# ordered (pitch, roll, yaw), quaternions are ordered (x, y, z, w) as in Quaternionr.as_array().
+def to_eularian_angles_array(quaternions):
+    """ Converts an (N, 4) array of quaternions to an (N, 3) array of (pitch, roll, yaw). A single (4,) quaternion gives (3,). """
+    quaternions = np.asarray(quaternions, dtype=np.float64)
+    x = quaternions[..., 0]
+    y = quaternions[..., 1]
+    z = quaternions[..., 2]
+    w = quaternions[..., 3]
+    ysqr = y * y
+
+    angles = np.empty(quaternions.shape[:-1] + (3,), dtype=np.float64)
+    angles[..., 0] = np.arcsin(np.clip(2.0 * (w*y - z*x), -1.0, 1.0))
+    angles[..., 1] = np.arctan2(2.0 * (w*x + y*z), 1.0 - 2.0*(x*x + ysqr))
+    angles[..., 2] = np.arctan2(2.0 * (w*z + x*y), 1.0 - 2.0 * (ysqr + z*z))
+    return angles
+
+def to_quaternion_array(angles):
+    """ Converts an (N, 3) array of (pitch, roll, yaw) to an (N, 4) array of quaternions. A single (3,) triple gives (4,). """
+    angles = np.asarray(angles, dtype=np.float64)
+    half_angles = angles * 0.5
+    cosines = np.cos(half_angles)
+    sines = np.sin(half_angles)
+    t0 = cosines[..., 2]
+    t1 = sines[..., 2]
+    t2 = cosines[..., 1]
+    t3 = sines[..., 1]
+    t4 = cosines[..., 0]
+    t5 = sines[..., 0]
+
+    quaternions = np.empty(angles.shape[:-1] + (4,), dtype=np.float64)
+    quaternions[..., 0] = t0 * t3 * t4 - t1 * t2 * t5 #x
+    quaternions[..., 1] = t0 * t2 * t5 + t1 * t3 * t4 #y
+    quaternions[..., 2] = t1 * t2 * t4 - t0 * t3 * t5 #z
+    quaternions[..., 3] = t0 * t2 * t4 + t1 * t3 * t5 #w
+    return quaternions
+
     
 def wait_key(message = ''):
     ''' Wait for a key press on the console and return it. '''
@@ -119,96 +188,30 @@ def wait_key(message = ''):
     return result
 
     
-def read_pfm(file):
-    """ Read a pfm file """
-    file = open(file, 'rb')
-
-    color = None
-    width = None
-    height = None
-    scale = None
-    endian = None
-
-    header = file.readline().rstrip()
-    header = str(bytes.decode(header, encoding='utf-8'))
-    if header == 'PF':
-        color = True
-    elif header == 'Pf':
-        color = False
-    else:
-        raise Exception('Not a PFM file.')
-
-    temp_str = str(bytes.decode(file.readline(), encoding='utf-8'))
-    dim_match = re.match(r'^(\d+)\s(\d+)\s$', temp_str)
-    if dim_match:
-        width, height = map(int, dim_match.groups())
-    else:
-        raise Exception('Malformed PFM header.')
-
-    scale = float(file.readline().rstrip())
-    if scale < 0: # little-endian
-        endian = '<'
-        scale = -scale
-    else:
-        endian = '>' # big-endian
-
-    data = np.fromfile(file, endian + 'f')
-    shape = (height, width, 3) if color else (height, width)
-
-    data = np.reshape(data, shape)
-    # DEY: I don't know why this was there.
-    #data = np.flipud(data)
-    file.close()
-    
-    return data, scale
+# PNG color type for each number of channels: grayscale, grayscale + alpha, RGB, RGBA
+_PNG_COLOR_TYPES = {1: 0, 2: 4, 3: 2, 4: 6}
 
-    
-def write_pfm(file, image, scale=1):
-    """ Write a pfm file """
-    file = open(file, 'wb')
-
-    color = None
-
-    if image.dtype.name != 'float32':
-        raise Exception('Image dtype must be float32.')
-
-    image = np.flipud(image)
-
-    if len(image.shape) == 3 and image.shape[2] == 3: # color image
-        color = True
-    elif len(image.shape) == 2 or len(image.shape) == 3 and image.shape[2] == 1: # greyscale
-        color = False
-    else:
-        raise Exception('Image must have H x W x 3, H x W x 1 or H x W dimensions.')
-
-    file.write('PF\n'.encode('utf-8')  if color else 'Pf\n'.encode('utf-8'))
-    temp_str = '%d %d\n' % (image.shape[1], image.shape[0])
-    file.write(temp_str.encode('utf-8'))
-
-    endian = image.dtype.byteorder
-
-    if endian == '<' or endian == '=' and sys.byteorder == 'little':
-        scale = -scale
-
-    temp_str = '%f\n' % scale
-    file.write(temp_str.encode('utf-8'))
+def encode_png(image, compression_level = 1):
+    """ image must be a uint8 numpy array H X W X channels (1 to 4 channels) or H X W for grayscale.
 
-    image.tofile(file)
-
-    
-def write_png(filename, image):
-    """ image must be numpy array H X W X channels
+    The rows are written bottom to top. compression_level is the zlib level; the default favors speed over size.
     """
     import zlib, struct
 
-    buf = image.flatten().tobytes()
-    width = image.shape[1]
-    height = image.shape[0]
+    image = np.asarray(image)
+    if image.ndim == 2:
+        image = image[:, :, np.newaxis]
+    if image.ndim != 3 or image.shape[2] not in _PNG_COLOR_TYPES:
+        raise ValueError('Expected an H X W X channels image with 1 to 4 channels, got shape {0}.'.format(image.shape))
+    if image.dtype != np.uint8:
+        raise ValueError('Expected a uint8 image, got {0}.'.format(image.dtype))
 
-    # reverse the vertical line order and add null bytes at the start
-    width_byte_4 = width * 4
-    raw_data = b''.join(b'\x00' + buf[span:span + width_byte_4]
-                        for span in range((height - 1) * width_byte_4, -1, - width_byte_4))
+    height, width, channels = image.shape
+
+    # reverse the vertical line order and add the filter byte (0, no filter) at the start of each line
+    raw_data = np.empty((height, (width * channels) + 1), dtype=np.uint8)
+    raw_data[:, 0] = 0
+    raw_data[:, 1:] = image[::-1].reshape(height, width * channels)
 
     def png_pack(png_tag, data):
         chunk_head = png_tag + data
@@ -216,10 +219,25 @@ def write_png(filename, image):
                 chunk_head +
                 struct.pack("!I", 0xFFFFFFFF & zlib.crc32(chunk_head)))
 
-    png_bytes = b''.join([
+    return b''.join([
         b'\x89PNG\r\n\x1a\n',
-        png_pack(b'IHDR', struct.pack("!2I5B", width, height, 8, 6, 0, 0, 0)),
-        png_pack(b'IDAT', zlib.compress(raw_data, 9)),
+        png_pack(b'IHDR', struct.pack("!2I5B", width, height, 8, _PNG_COLOR_TYPES[channels], 0, 0, 0)),
+        png_pack(b'IDAT', zlib.compress(raw_data, compression_level)),
         png_pack(b'IEND', b'')])
 
-    write_file(filename, png_bytes)
+def write_png(filename, image, compression_level = 1):
+    """ image must be numpy array H X W X channels
+    """
+    write_file(filename, encode_png(image, compression_level))
+
+def write_pngs(filenames, images, compression_level = 1, max_workers = None):
+    """ Writes each image to the matching filename, encoding them in parallel on a thread pool.
+
+    zlib releases the GIL while compressing, so the frames are encoded concurrently.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers = max_workers) as executor:
+        futures = [executor.submit(write_png, filename, image, compression_level) for filename, image in zip(filenames, images)]
+        for future in futures:
+            future.result()
@@ -0,0 +1,38 @@
+""" Measures how long a fresh interpreter takes to import the airsim package, and what the first use of it costs.
+
+Usage: python benchmarks/bench_import_airsim.py [--repeats 10]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+PACKAGE_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Importing everything up front is what "import airsim" used to do
+CASES = [('python startup', 'pass'),
+         ('import airsim', 'import airsim'),
+         ('airsim.Vector3r', 'import airsim; airsim.Vector3r'),
+         ('import airsim.pfm', 'import airsim.pfm'),
+         ('airsim.VehicleClient', 'import airsim; airsim.VehicleClient'),
+         ('eager (client + utils)', 'import airsim.client, airsim.utils, airsim.airsim_types')]
+
+def time_statement(statement, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.check_call([sys.executable, '-c', statement], cwd=PACKAGE_ROOT)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the import time of the airsim package.')
+    parser.add_argument('--repeats', type=int, default=10)
+    args = parser.parse_args()
+
+    for name, statement in CASES:
+        print('{0:<24} {1:8.1f} ms'.format(name, 1000.0 * time_statement(statement, args.repeats)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+""" Checks the vectorized rotation conversions against the scalar ones and times both.
+
+Usage: python benchmarks/bench_rotations.py [--samples 1000000]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import airsim.airsim_types as at
+import airsim.utils as utils
+
+def random_angles(num_samples, random_state):
+    # Pitch stays away from +-90 degrees, where roll and yaw are not unique
+    angles = np.empty((num_samples, 3), dtype=np.float64)
+    angles[:, 0] = random_state.uniform(-0.49 * np.pi, 0.49 * np.pi, num_samples)
+    angles[:, 1] = random_state.uniform(-np.pi, np.pi, num_samples)
+    angles[:, 2] = random_state.uniform(-np.pi, np.pi, num_samples)
+    return angles
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the quaternion/Euler conversions.')
+    parser.add_argument('--samples', type=int, default=1000000)
+    args = parser.parse_args()
+
+    random_state = np.random.RandomState(0)
+    angles = random_angles(args.samples, random_state)
+
+    start = time.perf_counter()
+    quaternions = utils.to_quaternion_array(angles)
+    round_trip = utils.to_eularian_angles_array(quaternions)
+    vectorized_seconds = time.perf_counter() - start
+
+    num_scalar = min(args.samples, 100000)
+    start = time.perf_counter()
+    scalar_quaternions = [utils.to_quaternion(*angle) for angle in angles[:num_scalar].tolist()]
+    scalar_round_trip = [utils.to_eularian_angles(quaternion) for quaternion in scalar_quaternions]
+    scalar_seconds = (time.perf_counter() - start) * args.samples / num_scalar
+
+    angle_error = np.abs(np.arctan2(np.sin(round_trip - angles), np.cos(round_trip - angles))).max()
+    scalar_error = max(np.abs(at.Quaternionr.stack(scalar_quaternions) - quaternions[:num_scalar]).max(), np.abs(np.array(scalar_round_trip) - round_trip[:num_scalar]).max())
+    norm_error = np.abs(np.linalg.norm(quaternions, axis=1) - 1.0).max()
+
+    print('{0} samples'.format(args.samples))
+    print('vectorized round trip {0:10.1f} ms'.format(1000.0 * vectorized_seconds))
+    print('scalar round trip     {0:10.1f} ms (extrapolated from {1} samples)'.format(1000.0 * scalar_seconds, num_scalar))
+    print('max round trip angle error {0:.3g} rad, max difference to scalar {1:.3g}, max quaternion norm error {2:.3g}'.format(angle_error, scalar_error, norm_error))
+
+    assert angle_error < 1e-9, 'round trip error too large'
+    assert scalar_error < 1e-12, 'vectorized and scalar conversions disagree'
+
+if __name__ == '__main__':
+    main()
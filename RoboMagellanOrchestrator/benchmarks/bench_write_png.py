@@ -0,0 +1,87 @@
+""" Compares airsim.utils.write_png against the scanline-join encoder it replaced.
+
+Usage: python benchmarks/bench_write_png.py [--width 640] [--height 480] [--frames 32]
+"""
+import argparse
+import os
+import struct
+import sys
+import tempfile
+import time
+import zlib
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import airsim.utils as utils
+
+def legacy_write_png(filename, image):
+    buf = image.flatten().tobytes()
+    width = image.shape[1]
+    height = image.shape[0]
+
+    width_byte_4 = width * 4
+    raw_data = b''.join(b'\x00' + buf[span:span + width_byte_4]
+                        for span in range((height - 1) * width_byte_4, -1, - width_byte_4))
+
+    def png_pack(png_tag, data):
+        chunk_head = png_tag + data
+        return (struct.pack("!I", len(data)) +
+                chunk_head +
+                struct.pack("!I", 0xFFFFFFFF & zlib.crc32(chunk_head)))
+
+    png_bytes = b''.join([
+        b'\x89PNG\r\n\x1a\n',
+        png_pack(b'IHDR', struct.pack("!2I5B", width, height, 8, 6, 0, 0, 0)),
+        png_pack(b'IDAT', zlib.compress(raw_data, 9)),
+        png_pack(b'IEND', b'')])
+
+    utils.write_file(filename, png_bytes)
+
+def make_frames(width, height, num_frames):
+    # Smooth gradients plus noise compress roughly like rendered camera frames
+    random_state = np.random.RandomState(0)
+    ys, xs = np.mgrid[0:height, 0:width]
+    frames = []
+    for i in range(num_frames):
+        frame = np.empty((height, width, 4), dtype=np.uint8)
+        frame[:, :, 0] = (xs + i) % 256
+        frame[:, :, 1] = (ys + (2 * i)) % 256
+        frame[:, :, 2] = random_state.randint(0, 32, size=(height, width))
+        frame[:, :, 3] = 255
+        frames.append(frame)
+    return frames
+
+def time_writes(name, write_frames, frames, directory):
+    filenames = [os.path.join(directory, '{0}_{1}.png'.format(name, i)) for i in range(len(frames))]
+    start = time.perf_counter()
+    write_frames(filenames, frames)
+    elapsed = time.perf_counter() - start
+
+    total_bytes = sum(os.path.getsize(filename) for filename in filenames)
+    print('{0:<28} {1:8.1f} ms/frame {2:8.1f} frames/s {3:8.1f} KiB/frame'.format(name, 1000.0 * elapsed / len(frames), len(frames) / elapsed, total_bytes / 1024.0 / len(frames)))
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the PNG encoder used for dataset dumps.')
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--frames', type=int, default=32)
+    args = parser.parse_args()
+
+    frames = make_frames(args.width, args.height, args.frames)
+    print('{0} RGBA frames of {1}x{2}'.format(args.frames, args.width, args.height))
+
+    with tempfile.TemporaryDirectory() as directory:
+        time_writes('legacy (level 9)', lambda filenames, images: [legacy_write_png(f, i) for f, i in zip(filenames, images)], frames, directory)
+        time_writes('write_png (level 9)', lambda filenames, images: [utils.write_png(f, i, 9) for f, i in zip(filenames, images)], frames, directory)
+        time_writes('write_png (level 1)', lambda filenames, images: [utils.write_png(f, i) for f, i in zip(filenames, images)], frames, directory)
+        time_writes('write_pngs (level 1)', utils.write_pngs, frames, directory)
+
+        # The encoders must produce the same image data
+        legacy_write_png(os.path.join(directory, 'legacy.png'), frames[0])
+        utils.write_png(os.path.join(directory, 'new.png'), frames[0], 9)
+        with open(os.path.join(directory, 'legacy.png'), 'rb') as legacy_file, open(os.path.join(directory, 'new.png'), 'rb') as new_file:
+            assert legacy_file.read() == new_file.read(), 'write_png output differs from the legacy encoder'
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+import collections
+import threading
+import time
+
+class CameraFrame(object):
+    """ The responses of one simGetImages() call.
+
+    time_stamp is the sim time of the capture in nanoseconds, taken from the first ImageResponse, and capture_time is the
+    time.perf_counter() at which the responses were received.
+    """
+    def __init__(self, frame_index, responses, capture_time):
+        self.frame_index = frame_index
+        self.responses = responses
+        self.capture_time = capture_time
+        self.time_stamp = responses[0].time_stamp if len(responses) > 0 else None
+
+class CameraCapture(threading.Thread):
+    """ Captures camera frames continuously from a background thread.
+
+    Every 1 / rate_hz seconds (or back to back if rate_hz is None), the image_requests are sent with simGetImages() and the
+    result is stored as a CameraFrame. The last buffer_size frames are kept and older ones are dropped, so a slow consumer
+    never stalls the capture. get_latest_frame() does not block, so it can be called from the control loop every tick.
+
+    A msgpack-rpc connection is not thread safe, so the capture must be given its own client connected to the same simulator,
+    or share a client created with pool_size > 1.
+    """
+    def __init__(self, client, image_requests, rate_hz=10.0, buffer_size=8, vehicle_name=''):
+        super(CameraCapture, self).__init__()
+        self.daemon = True
+
+        if (buffer_size < 1):
+            raise ValueError('buffer_size must be at least 1.')
+
+        self.client = client
+        self.image_requests = image_requests
+        self.rate_hz = rate_hz
+        self.vehicle_name = vehicle_name
+        self.frames = collections.deque(maxlen=buffer_size)
+        self.latest_frame = None
+        self.frame_count = 0
+        self.dropped_frame_count = 0
+        self.error = None
+        self.__stop_event = threading.Event()
+
+    def run(self):
+        try:
+            period = (1.0 / self.rate_hz) if self.rate_hz is not None else 0
+            next_capture_time = time.perf_counter()
+            while not self.__stop_event.is_set():
+                responses = self.client.simGetImages(self.image_requests, self.vehicle_name)
+                frame = CameraFrame(self.frame_count, responses, time.perf_counter())
+
+                # The deque drops the oldest frame on append when it is full
+                if (len(self.frames) == self.frames.maxlen):
+                    self.dropped_frame_count += 1
+                self.frames.append(frame)
+                self.latest_frame = frame
+                self.frame_count += 1
+
+                # Captures are scheduled on a fixed grid so that the rate does not drift with the capture latency.
+                # If a capture overran its slot, the missed slots are skipped instead of captured in a burst.
+                next_capture_time += period
+                now = time.perf_counter()
+                if (next_capture_time < now):
+                    next_capture_time = now
+                self.__stop_event.wait(next_capture_time - now)
+        except Exception as e:
+            self.error = e
+
+    def get_latest_frame(self):
+        """ Returns the most recent frame, or None if no frame has been captured yet. """
+        return self.latest_frame
+
+    def get_frames(self):
+        """ Removes and returns the buffered frames, oldest first. """
+        frames = []
+        while True:
+            try:
+                frames.append(self.frames.popleft())
+            except IndexError:
+                return frames
+
+    def stop(self):
+        self.__stop_event.set()
+        self.join()
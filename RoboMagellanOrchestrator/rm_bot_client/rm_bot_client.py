@@ -4,8 +4,8 @@ import airsim
 import airsim.airsim_types as at
 
 class RmBotClient(airsim.UrdfBotClient, object):
-    def __init__(self):
-        super(RmBotClient, self).__init__()
+    def __init__(self, ip = "", port = 41451, timeout_value = 60, pool_size = 1, max_reconnect_attempts = 0, reconnect_backoff = 0.5):
+        super(RmBotClient, self).__init__(ip, port, timeout_value, pool_size, max_reconnect_attempts, reconnect_backoff)
         self.confirmConnection()
         self.enableApiControl(True)
 
@@ -14,13 +14,38 @@ class RmBotClient(airsim.UrdfBotClient, object):
         self.bl_joint_name = 'main_box_to_wheel_bl'
         self.br_joint_name = 'main_box_to_wheel_br'
 
-    def drive(self, left_throttle, right_throttle):
-        front_right_update_obj = at.UrdfBotControlledMotionComponentControlSignal(component_name=self.fr_joint_name, control_signal_values={'Value': right_throttle})
-        front_left_update_obj = at.UrdfBotControlledMotionComponentControlSignal(component_name=self.fl_joint_name, control_signal_values={'Value': left_throttle})
-        back_right_update_obj = at.UrdfBotControlledMotionComponentControlSignal(component_name=self.br_joint_name, control_signal_values={'Value': right_throttle})
-        back_left_update_obj = at.UrdfBotControlledMotionComponentControlSignal(component_name=self.bl_joint_name, control_signal_values={'Value': left_throttle})
+        # The control signals are allocated once and only their values are updated on each drive() call
+        self.front_right_update_obj = at.UrdfBotControlledMotionComponentControlSignal(component_name=self.fr_joint_name, control_signal_values={'Value': 0})
+        self.front_left_update_obj = at.UrdfBotControlledMotionComponentControlSignal(component_name=self.fl_joint_name, control_signal_values={'Value': 0})
+        self.back_right_update_obj = at.UrdfBotControlledMotionComponentControlSignal(component_name=self.br_joint_name, control_signal_values={'Value': 0})
+        self.back_left_update_obj = at.UrdfBotControlledMotionComponentControlSignal(component_name=self.bl_joint_name, control_signal_values={'Value': 0})
 
-        self.updateControlledMotionComponentControlSignal(front_right_update_obj)
-        self.updateControlledMotionComponentControlSignal(front_left_update_obj)
-        self.updateControlledMotionComponentControlSignal(back_right_update_obj)
-        self.updateControlledMotionComponentControlSignal(back_left_update_obj)
+        self.last_left_throttle = None
+        self.last_right_throttle = None
+
+    def drive(self, left_throttle, right_throttle, force = False):
+        if (not force and left_throttle == self.last_left_throttle and right_throttle == self.last_right_throttle):
+            return
+
+        self.front_right_update_obj.control_signal_values['Value'] = right_throttle
+        self.front_left_update_obj.control_signal_values['Value'] = left_throttle
+        self.back_right_update_obj.control_signal_values['Value'] = right_throttle
+        self.back_left_update_obj.control_signal_values['Value'] = left_throttle
+
+        # Pipeline all four wheel updates so that they reach the sim back to back and cost a single round trip
+        with self.batch():
+            self.updateControlledMotionComponentControlSignal(self.front_right_update_obj)
+            self.updateControlledMotionComponentControlSignal(self.front_left_update_obj)
+            self.updateControlledMotionComponentControlSignal(self.back_right_update_obj)
+            self.updateControlledMotionComponentControlSignal(self.back_left_update_obj)
+
+        self.last_left_throttle = left_throttle
+        self.last_right_throttle = right_throttle
+
+    def reset(self):
+        # Waited for even in async mode, so that no drive() can reach the sim before the reset
+        self._call_sync('reset')
+
+        # The sim state is reinitialized, so the next drive() must always be sent
+        self.last_left_throttle = None
+        self.last_right_throttle = None
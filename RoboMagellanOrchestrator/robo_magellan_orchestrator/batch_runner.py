@@ -0,0 +1,150 @@
+import csv
+import importlib
+import json
+import time
+
+import robo_magellan_orchestrator.lock_step as lock_step
+
+RESULT_FIELDS = ['seed',
+                 'score',
+                 'runEndReason',
+                 'elapsedTime',
+                 'conesVisited',
+                 'goalVisited',
+                 'closestDistance',
+                 'ticks',
+                 'simSecondsPerWallSecond',
+                 'spawnSeconds',
+                 'runSeconds',
+                 'cleanupSeconds']
+
+def load_controller_factory(controller_path):
+    """ Resolves a "module:factory" path. The factory is called without arguments to build a controller. """
+    module_name, factory_name = controller_path.split(':')
+    module = importlib.import_module(module_name)
+    return getattr(module, factory_name)
+
+class BatchRunner(object):
+    """ Executes many orchestrated runs back to back on one connection.
+
+    The controller is called once per tick as controller(client, orchestrator) and returns the (left, right) throttle.
+    If it has a reset() method, that is called before every run. The spawned meshes are kept between runs and moved into
+    place for the next one, and the ground cache and spawn pools of the orchestrator are reused.
+
+    With step_seconds, the runs are executed in lock-step: the sim is paused, and each tick advances it by exactly
+    step_seconds with a lock_step.LockStepper, so the runs are timed in sim seconds and are reproducible from the seed.
+    The orchestrator's clock is replaced by the stepper's SimClock.
+
+    With a telemetry_recorder, every tick of every run is recorded. The recorder is not closed by the runner.
+    """
+    def __init__(self, orchestrator, client, controller, results_file_path=None, results_format='jsonl', step_seconds=None, telemetry_recorder=None):
+        if (results_format not in ('jsonl', 'csv')):
+            raise ValueError('Unrecognized results_format: {0}. Valid options are "jsonl" and "csv".'.format(results_format))
+
+        self.orchestrator = orchestrator
+        self.client = client
+        self.controller = controller
+        self.results_file_path = results_file_path
+        self.results_format = results_format
+
+        self.stepper = None
+        if (step_seconds is not None):
+            self.stepper = lock_step.LockStepper(client, step_seconds)
+            self.orchestrator.set_clock(self.stepper.clock)
+
+        if (telemetry_recorder is not None):
+            self.orchestrator.set_telemetry_recorder(telemetry_recorder)
+
+    def run(self, seeds):
+        """ Runs one competition run per seed and returns the aggregate statistics of the batch. """
+        results_file = None
+        csv_writer = None
+        if (self.results_file_path is not None):
+            results_file = open(self.results_file_path, 'w', newline='')
+            if (self.results_format == 'csv'):
+                csv_writer = csv.DictWriter(results_file, fieldnames=RESULT_FIELDS)
+                csv_writer.writeheader()
+
+        batch_start = time.perf_counter()
+        results = []
+        try:
+            for seed in seeds:
+                result = self.run_one(seed)
+                results.append(result)
+
+                if (csv_writer is not None):
+                    csv_writer.writerow(result)
+                    results_file.flush()
+                elif (results_file is not None):
+                    results_file.write(json.dumps(result) + '\n')
+                    results_file.flush()
+        finally:
+            self.orchestrator.clean_up_run(self.client)
+            if (self.stepper is not None):
+                self.stepper.stop()
+            if (results_file is not None):
+                results_file.close()
+
+        return self.__get_statistics(results, time.perf_counter() - batch_start)
+
+    def run_one(self, seed):
+        if (hasattr(self.controller, 'reset')):
+            self.controller.reset()
+
+        phase_start = time.perf_counter()
+        if (self.stepper is not None):
+            self.stepper.start()
+        self.orchestrator.set_random_seed(seed)
+        self.orchestrator.start_new_run(self.client)
+        spawn_seconds = time.perf_counter() - phase_start
+
+        phase_start = time.perf_counter()
+        ticks = 0
+        status = self.orchestrator.status
+        while (not status.run_complete):
+            left_throttle, right_throttle = self.controller(self.client, self.orchestrator)
+            self.client.drive(left_throttle, right_throttle)
+            if (self.stepper is not None):
+                self.stepper.step()
+            self.orchestrator.run_tick(self.client)
+            ticks += 1
+        self.client.drive(0, 0)
+        run_seconds = time.perf_counter() - phase_start
+
+        summary = self.orchestrator.get_run_summary(self.client)
+
+        phase_start = time.perf_counter()
+        self.orchestrator.clean_up_run(self.client, keep_objects=True)
+        cleanup_seconds = time.perf_counter() - phase_start
+
+        result = {}
+        result['seed'] = seed
+        result['score'] = summary['score']
+        result['runEndReason'] = summary['runEndReason']
+        # The time the run ended at; the summary reads the clock again, after the run
+        result['elapsedTime'] = status.run_time_seconds
+        result['conesVisited'] = sum(1 for cone_info in summary['coneInfo'] if cone_info['visited'])
+        result['goalVisited'] = summary['goalInfo']['visited']
+        result['closestDistance'] = summary['goalInfo']['closestDistance']
+        result['ticks'] = ticks
+        result['simSecondsPerWallSecond'] = (status.run_time_seconds / run_seconds) if run_seconds > 0 else 0
+        result['spawnSeconds'] = spawn_seconds
+        result['runSeconds'] = run_seconds
+        result['cleanupSeconds'] = cleanup_seconds
+
+        return result
+
+    def __get_statistics(self, results, total_seconds):
+        statistics = {}
+        statistics['runs'] = len(results)
+        statistics['totalSeconds'] = total_seconds
+        statistics['runsPerHour'] = (3600.0 * len(results) / total_seconds) if total_seconds > 0 else 0
+
+        total_run_seconds = sum(result['runSeconds'] for result in results)
+        statistics['simSecondsPerWallSecond'] = (sum(result['elapsedTime'] for result in results) / total_run_seconds) if total_run_seconds > 0 else 0
+
+        for phase in ('spawnSeconds', 'runSeconds', 'cleanupSeconds'):
+            phase_times = [result[phase] for result in results]
+            statistics['mean' + phase[0].upper() + phase[1:]] = (sum(phase_times) / len(phase_times)) if len(phase_times) > 0 else 0
+
+        return statistics
@@ -19,6 +19,7 @@ class ConeWaypoint(spawnable_object.SpawnableObject):
         self.visited = False
         self.random_name = str(uuid.uuid4())
         self.visited_time_stamp = None
+        self.is_spawned = False
 
     def reset(self):
         self.visited = False
@@ -26,11 +27,24 @@ class ConeWaypoint(spawnable_object.SpawnableObject):
 
     def spawn(self, client):
         self.spawn_pose = self.get_valid_spawn_coordinates(client, True)
-        client.simSpawnStaticMeshObject(self.mesh_name, self.random_name, self.spawn_pose)
-        client.simSetSegmentationObjectID(self.random_name, 235)
+
+        # A mesh left in the world by the previous run is moved instead of being deleted and spawned again
+        if (self.is_spawned):
+            client.simSetObjectPose(self.random_name, self.spawn_pose, True)
+        else:
+            client.simSpawnStaticMeshObject(self.mesh_name, self.random_name, self.spawn_pose)
+            client.simSetSegmentationObjectID(self.random_name, 235)
+            self.is_spawned = True
+
+        if (self.object_registry is not None):
+            self.object_registry.register(self.random_name, self)
 
     def delete(self, client):
-        client.simDeleteObject(self.random_name)
+        if (self.is_spawned):
+            client.simDeleteObject(self.random_name)
+            self.is_spawned = False
+            if (self.object_registry is not None):
+                self.object_registry.unregister(self.random_name)
         self.reset()
 
     def set_visited(self, time_stamp):
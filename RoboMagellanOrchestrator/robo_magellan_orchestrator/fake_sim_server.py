@@ -0,0 +1,261 @@
+import argparse
+import math
+import threading
+import time
+
+import msgpackrpc
+
+def _vector(x=0.0, y=0.0, z=0.0):
+    return {'x_val': float(x), 'y_val': float(y), 'z_val': float(z)}
+
+def _quaternion_from_yaw(yaw):
+    return {'w_val': math.cos(yaw * 0.5), 'x_val': 0.0, 'y_val': 0.0, 'z_val': math.sin(yaw * 0.5)}
+
+def _yaw_from_quaternion(q):
+    return math.atan2(2.0 * ((q['w_val'] * q['z_val']) + (q['x_val'] * q['y_val'])),
+                      1.0 - (2.0 * ((q['y_val'] * q['y_val']) + (q['z_val'] * q['z_val']))))
+
+class FakeSimulator(object):
+    """ Stand-in for the AirSim server implementing the APIs used by the orchestrator and RmBotClient.
+
+    The ground is a flat landscape, the bot is a differential drive whose wheel speeds follow the last throttle commands,
+    and touching a spawned object within collision_radius registers a collision with it. Sim time advances with the wall
+    clock while unpaused, or by exactly the requested amount in simContinueForTime. calls counts the requests per API.
+    """
+    def __init__(self, ground_height=0.0, max_speed=2.0, track_width=0.5, collision_radius=0.6, image_width=64, image_height=48):
+        self.ground_height = ground_height
+        self.image_width = image_width
+        self.image_height = image_height
+        self.max_speed = max_speed
+        self.track_width = track_width
+        self.collision_radius = collision_radius
+
+        self.calls = {}
+        self.objects = {}
+        self.wheel_throttles = {}
+        self.x = 0.0
+        self.y = 0.0
+        self.z = ground_height
+        self.yaw = 0.0
+        self.sim_time_ns = 0
+        self.is_paused = False
+        self.last_wall_time = time.perf_counter()
+        self.collision_object_name = ''
+        self.collision_time_stamp = 0
+
+        self.__lock = threading.Lock()
+
+    # -----------------------------------  Connection ---------------------------------------------
+    def ping(self):
+        self.__count('ping')
+        return True
+
+    def getServerVersion(self):
+        return 1
+
+    def getMinRequiredClientVersion(self):
+        return 1
+
+    def enableApiControl(self, is_enabled, vehicle_name):
+        self.__count('enableApiControl')
+
+    def reset(self):
+        self.__count('reset')
+        with self.__lock:
+            self.x = 0.0
+            self.y = 0.0
+            self.yaw = 0.0
+            self.wheel_throttles = {}
+
+    # -----------------------------------  Time ---------------------------------------------
+    def simPause(self, is_paused):
+        self.__count('simPause')
+        with self.__lock:
+            self.__advance_with_wall_clock()
+            self.is_paused = is_paused
+
+    def simIsPaused(self):
+        return self.is_paused
+
+    def simContinueForTime(self, seconds):
+        self.__count('simContinueForTime')
+        with self.__lock:
+            self.__step(seconds)
+            self.is_paused = True
+
+    # -----------------------------------  Vehicle state ---------------------------------------------
+    def simGetVehiclePose(self, vehicle_name):
+        self.__count('simGetVehiclePose')
+        with self.__lock:
+            self.__advance_with_wall_clock()
+            return {'position': _vector(self.x, self.y, self.z), 'orientation': _quaternion_from_yaw(self.yaw)}
+
+    def simSetVehiclePose(self, pose, ignore_collision, vehicle_name):
+        self.__count('simSetVehiclePose')
+        with self.__lock:
+            self.__advance_with_wall_clock()
+            self.x = pose['position']['x_val']
+            self.y = pose['position']['y_val']
+            self.z = pose['position']['z_val']
+            self.yaw = _yaw_from_quaternion(pose['orientation'])
+
+    def simGetGroundTruthKinematics(self, vehicle_name):
+        self.__count('simGetGroundTruthKinematics')
+        with self.__lock:
+            self.__advance_with_wall_clock()
+            speed, yaw_rate = self.__get_body_velocity()
+            return {'position': _vector(self.x, self.y, self.z),
+                    'orientation': _quaternion_from_yaw(self.yaw),
+                    'linear_velocity': _vector(speed * math.cos(self.yaw), speed * math.sin(self.yaw), 0),
+                    'angular_velocity': _vector(0, 0, yaw_rate),
+                    'linear_acceleration': _vector(),
+                    'angular_acceleration': _vector()}
+
+    def simGetCollisionInfo(self, vehicle_name):
+        self.__count('simGetCollisionInfo')
+        with self.__lock:
+            self.__advance_with_wall_clock()
+            return {'has_collided': self.collision_time_stamp != 0,
+                    'normal': _vector(),
+                    'impact_point': _vector(),
+                    'position': _vector(self.x, self.y, self.z),
+                    'penetration_depth': 0.0,
+                    'time_stamp': self.collision_time_stamp,
+                    'object_name': self.collision_object_name,
+                    'object_id': -1}
+
+    def updateControlledMotionComponentControlSignal(self, control_signal, vehicle_name):
+        self.__count('updateControlledMotionComponentControlSignal')
+        with self.__lock:
+            self.__advance_with_wall_clock()
+            self.wheel_throttles[control_signal['component_name']] = float(control_signal['control_signal_values']['Value'])
+
+    # -----------------------------------  Cameras ---------------------------------------------
+    def simGetImages(self, requests, vehicle_name):
+        self.__count('simGetImages')
+        with self.__lock:
+            self.__advance_with_wall_clock()
+            pose = {'position': _vector(self.x, self.y, self.z), 'orientation': _quaternion_from_yaw(self.yaw)}
+            time_stamp = self.sim_time_ns
+
+        # Images are blank and uncompressed: 3 bytes per pixel, or one float per pixel
+        num_pixels = self.image_width * self.image_height
+        responses = []
+        for request in requests:
+            responses.append({'image_data_uint8': b'' if request['pixels_as_float'] else bytes(3 * num_pixels),
+                              'image_data_float': [0.0] * num_pixels if request['pixels_as_float'] else [],
+                              'camera_position': pose['position'],
+                              'camera_orientation': pose['orientation'],
+                              'time_stamp': time_stamp,
+                              'message': '',
+                              'pixels_as_float': request['pixels_as_float'],
+                              'compress': False,
+                              'width': self.image_width,
+                              'height': self.image_height,
+                              'image_type': request['image_type']})
+        return responses
+
+    # -----------------------------------  World ---------------------------------------------
+    def simRayCast(self, request, vehicle_name):
+        self.__count('simRayCast')
+        hit_point = _vector(request['position']['x_val'], request['position']['y_val'], self.ground_height)
+        return {'hits': [{'collided_actor_name': 'Landscape', 'hit_point': hit_point, 'hit_normal': _vector(0, 0, 1)}]}
+
+    def simSpawnStaticMeshObject(self, object_class_name, object_name, pose):
+        self.__count('simSpawnStaticMeshObject')
+        with self.__lock:
+            self.objects[object_name] = pose
+        return True
+
+    def simSetObjectPose(self, object_name, pose, teleport):
+        self.__count('simSetObjectPose')
+        with self.__lock:
+            if (object_name not in self.objects):
+                return False
+            self.objects[object_name] = pose
+        return True
+
+    def simGetObjectPose(self, object_name):
+        self.__count('simGetObjectPose')
+        return self.objects.get(object_name)
+
+    def simDeleteObject(self, object_name):
+        self.__count('simDeleteObject')
+        with self.__lock:
+            return self.objects.pop(object_name, None) is not None
+
+    def simSetSegmentationObjectID(self, mesh_name, object_id, is_name_regex):
+        self.__count('simSetSegmentationObjectID')
+        return True
+
+    def simSetDrawableShapes(self, request, vehicle_name):
+        self.__count('simSetDrawableShapes')
+
+    def __count(self, api_name):
+        self.calls[api_name] = self.calls.get(api_name, 0) + 1
+
+    def __advance_with_wall_clock(self):
+        now = time.perf_counter()
+        if (not self.is_paused):
+            self.__step(now - self.last_wall_time)
+        self.last_wall_time = now
+
+    def __get_body_velocity(self):
+        left = (self.wheel_throttles.get('main_box_to_wheel_fl', 0.0) + self.wheel_throttles.get('main_box_to_wheel_bl', 0.0)) * 0.5
+        right = (self.wheel_throttles.get('main_box_to_wheel_fr', 0.0) + self.wheel_throttles.get('main_box_to_wheel_br', 0.0)) * 0.5
+
+        # Yaw increases clockwise in AirSim's NED frame, so a faster right wheel lowers it
+        speed = self.max_speed * (left + right) * 0.5
+        yaw_rate = self.max_speed * (left - right) / self.track_width
+        return (speed, yaw_rate)
+
+    def __step(self, seconds):
+        if (seconds <= 0):
+            return
+
+        speed, yaw_rate = self.__get_body_velocity()
+        self.x += speed * math.cos(self.yaw) * seconds
+        self.y += speed * math.sin(self.yaw) * seconds
+        self.yaw += yaw_rate * seconds
+        self.sim_time_ns += int(round(seconds * 1e9))
+
+        radius_sq = self.collision_radius * self.collision_radius
+        for object_name, pose in self.objects.items():
+            dx = pose['position']['x_val'] - self.x
+            dy = pose['position']['y_val'] - self.y
+            if ((dx * dx) + (dy * dy) <= radius_sq):
+                self.collision_object_name = object_name
+                self.collision_time_stamp = self.sim_time_ns
+
+class FakeSimServer(object):
+    """ Serves a FakeSimulator over msgpack-rpc from a background thread. """
+    def __init__(self, port=41451, ip='127.0.0.1', simulator=None):
+        self.simulator = simulator if simulator is not None else FakeSimulator()
+        self.loop = msgpackrpc.Loop()
+        self.server = msgpackrpc.Server(self.simulator, loop=self.loop, pack_encoding='utf-8', unpack_encoding='utf-8')
+        self.server.listen(msgpackrpc.Address(ip, port))
+        self.thread = threading.Thread(target=self.server.start)
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        # The tornado loop is not thread safe, so it has to be stopped from its own thread
+        self.loop._ioloop.add_callback(self.server.stop)
+        self.thread.join()
+        self.server.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Serves a fake simulator that stands in for AirSim.')
+    parser.add_argument('--ip', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=41451)
+    args = parser.parse_args()
+
+    server = FakeSimServer(args.port, args.ip)
+    print('Fake simulator listening on {0}:{1}.'.format(args.ip, args.port))
+    server.server.start()
+
+if __name__ == '__main__':
+    main()
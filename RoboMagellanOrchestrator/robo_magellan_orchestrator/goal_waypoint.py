@@ -27,6 +27,7 @@ class GoalWaypoint(spawnable_object.SpawnableObject):
         self.velocity_tolerance = self.velocity_tolerance ** 2
 
         self.goal_center = None
+        self.is_spawned = False
         self.visited = False
         self.visited_time_stamp = None
         self.closest_distance = float('inf')
@@ -41,18 +42,23 @@ class GoalWaypoint(spawnable_object.SpawnableObject):
         self.goal_center = self.spawn_pose.position
 
         if (self.cone_type != None):
-            client.simSpawnStaticMeshObject(self.mesh_name, self.random_name, self.spawn_pose)
-            client.simSetSegmentationObjectID(self.random_name, 235)
+            # A mesh left in the world by the previous run is moved instead of being deleted and spawned again
+            if (self.is_spawned):
+                client.simSetObjectPose(self.random_name, self.spawn_pose, True)
+            else:
+                client.simSpawnStaticMeshObject(self.mesh_name, self.random_name, self.spawn_pose)
+                client.simSetSegmentationObjectID(self.random_name, 235)
+                self.is_spawned = True
+
+            if (self.object_registry is not None):
+                self.object_registry.register(self.random_name, self)
 
-    def is_bot_at_goal(self, client):
+    def is_bot_at_goal(self, snapshot):
         if (self.goal_center == None):
             return False
 
-        pose = client.simGetVehiclePose()
-        kinematics = client.simGetGroundTruthKinematics()
-
-        distance_from_goal = self.__l2_sq(pose.position, self.goal_center)
-        velocity = self.__vec_length_sq(kinematics.linear_velocity)
+        distance_from_goal = self.__l2_sq(snapshot.pose.position, self.goal_center)
+        velocity = self.__vec_length_sq(snapshot.kinematics.linear_velocity)
 
         self.closest_distance = min(self.closest_distance, distance_from_goal)
 
@@ -63,12 +69,15 @@ class GoalWaypoint(spawnable_object.SpawnableObject):
         self.visited_time_stamp = time_stamp
 
     def delete(self, client):
-        if (self.cone_type != None):
+        if (self.is_spawned):
             client.simDeleteObject(self.random_name)
-            self.reset()
+            self.is_spawned = False
+            if (self.object_registry is not None):
+                self.object_registry.unregister(self.random_name)
+        self.reset()
 
     def __l2_sq(self, a, b):
         return ((a.x_val-b.x_val)*(a.x_val-b.x_val)) + ((a.y_val-b.y_val)*(a.y_val-b.y_val)) + ((a.z_val-b.z_val)*(a.z_val-b.z_val))
 
     def __vec_length_sq(self, a):
-        return (a.x_val*a.x_val) + (a.y_val*a.y_val) * (a.z_val*a.z_val)
+        return (a.x_val*a.x_val) + (a.y_val*a.y_val) + (a.z_val*a.z_val)
@@ -0,0 +1,166 @@
+import math
+import os
+import numpy as np
+
+import airsim
+import airsim.airsim_types as at
+import robo_magellan_orchestrator.raycast_utils as raycast_utils
+
+# Values stored in GroundCache.status for each grid cell
+CELL_UNKNOWN = 0
+CELL_GROUND = 1
+CELL_NO_GROUND = 2
+
+class GroundCache(object):
+    """ Ground height and normal sampled on a regular XY grid.
+
+    Each grid vertex is raycast at most once. Queries between vertices are answered by bilinear
+    interpolation of the four surrounding vertices. If any of them is under water or has no ground,
+    the query is treated as having no ground, like get_ground() does.
+    """
+    def __init__(self, min_x, min_y, max_x, max_y, resolution):
+        if (resolution <= 0):
+            raise ValueError('Ground cache resolution must be positive, got {0}.'.format(resolution))
+
+        self.resolution = float(resolution)
+        self.origin_x = float(min_x)
+        self.origin_y = float(min_y)
+        self.num_x = int(math.ceil((max_x - min_x) / self.resolution)) + 1
+        self.num_y = int(math.ceil((max_y - min_y) / self.resolution)) + 1
+
+        self.heights = np.zeros((self.num_x, self.num_y), dtype=np.float64)
+        self.normals = np.zeros((self.num_x, self.num_y, 3), dtype=np.float64)
+        self.status = np.full((self.num_x, self.num_y), CELL_UNKNOWN, dtype=np.uint8)
+        self.is_dirty = False
+
+    @staticmethod
+    def from_polygons(polygons, resolution, padding=1.0):
+        min_x = min(polygon.bounds[0] for polygon in polygons) - padding
+        min_y = min(polygon.bounds[1] for polygon in polygons) - padding
+        max_x = max(polygon.bounds[2] for polygon in polygons) + padding
+        max_y = max(polygon.bounds[3] for polygon in polygons) + padding
+
+        # Snap the grid to multiples of the resolution so that caches built from slightly different bounds line up
+        min_x = math.floor(min_x / resolution) * resolution
+        min_y = math.floor(min_y / resolution) * resolution
+
+        return GroundCache(min_x, min_y, max_x, max_y, resolution)
+
+    @staticmethod
+    def load(file_path):
+        with np.load(file_path) as data:
+            grid = data['grid']
+            cache = GroundCache.__new__(GroundCache)
+            cache.origin_x = float(grid[0])
+            cache.origin_y = float(grid[1])
+            cache.resolution = float(grid[2])
+            cache.heights = data['heights']
+            cache.normals = data['normals']
+            cache.status = data['status']
+            cache.num_x, cache.num_y = cache.status.shape
+            cache.is_dirty = False
+
+        return cache
+
+    def save(self, file_path):
+        # Write to a temporary file first so that an interrupted save never leaves a truncated cache behind
+        temp_file_path = file_path + '.tmp.npz'
+        np.savez(temp_file_path,
+                 grid=np.array([self.origin_x, self.origin_y, self.resolution]),
+                 heights=self.heights,
+                 normals=self.normals,
+                 status=self.status)
+        os.replace(temp_file_path, file_path)
+        self.is_dirty = False
+
+    def has_same_grid(self, other):
+        return (self.num_x == other.num_x
+                and self.num_y == other.num_y
+                and math.isclose(self.resolution, other.resolution)
+                and math.isclose(self.origin_x, other.origin_x)
+                and math.isclose(self.origin_y, other.origin_y))
+
+    def contains(self, x, y):
+        fx = (x - self.origin_x) / self.resolution
+        fy = (y - self.origin_y) / self.resolution
+        return (fx >= 0 and fy >= 0 and fx <= self.num_x - 1 and fy <= self.num_y - 1)
+
+    def contains_batch(self, xs, ys):
+        fx = (np.asarray(xs) - self.origin_x) / self.resolution
+        fy = (np.asarray(ys) - self.origin_y) / self.resolution
+        return (fx >= 0) & (fy >= 0) & (fx <= self.num_x - 1) & (fy <= self.num_y - 1)
+
+    def is_complete(self):
+        return not np.any(self.status == CELL_UNKNOWN)
+
+    def prefetch(self, client):
+        """ Raycast every grid vertex that is not known yet. Returns the number of raycasts made. """
+        unknown_x, unknown_y = np.nonzero(self.status == CELL_UNKNOWN)
+        self.__fill_cells(unknown_x, unknown_y, client)
+
+        return len(unknown_x)
+
+    def get_ground(self, x, y, client):
+        z_coords, normals = self.get_ground_batch(np.array([x]), np.array([y]), client)
+        if (np.isnan(z_coords[0])):
+            return (None, None)
+
+        return (float(z_coords[0]), at.Vector3r(x_val=float(normals[0, 0]), y_val=float(normals[0, 1]), z_val=float(normals[0, 2])))
+
+    def get_ground_batch(self, xs, ys, client):
+        """ Interpolated ground height and normal for points inside the grid. Points without ground are NaN. """
+        fx = (np.asarray(xs, dtype=np.float64) - self.origin_x) / self.resolution
+        fy = (np.asarray(ys, dtype=np.float64) - self.origin_y) / self.resolution
+        ix = np.minimum(fx.astype(np.int64), self.num_x - 2)
+        iy = np.minimum(fy.astype(np.int64), self.num_y - 2)
+        tx = (fx - ix)[:, np.newaxis]
+        ty = (fy - iy)[:, np.newaxis]
+
+        corners_x = np.concatenate((ix, ix + 1, ix, ix + 1))
+        corners_y = np.concatenate((iy, iy, iy + 1, iy + 1))
+        unknown = (self.status[corners_x, corners_y] == CELL_UNKNOWN)
+        if (np.any(unknown)):
+            unknown_cells = np.unique(np.stack((corners_x[unknown], corners_y[unknown]), axis=1), axis=0)
+            self.__fill_cells(unknown_cells[:, 0], unknown_cells[:, 1], client)
+
+        w00 = (1 - tx) * (1 - ty)
+        w10 = tx * (1 - ty)
+        w01 = (1 - tx) * ty
+        w11 = tx * ty
+
+        z_coords = ((w00[:, 0] * self.heights[ix, iy])
+                    + (w10[:, 0] * self.heights[ix+1, iy])
+                    + (w01[:, 0] * self.heights[ix, iy+1])
+                    + (w11[:, 0] * self.heights[ix+1, iy+1]))
+        normals = ((w00 * self.normals[ix, iy])
+                   + (w10 * self.normals[ix+1, iy])
+                   + (w01 * self.normals[ix, iy+1])
+                   + (w11 * self.normals[ix+1, iy+1]))
+        # Cells without ground hold zero normals, which are masked out below
+        with np.errstate(divide='ignore', invalid='ignore'):
+            normals = normals / np.linalg.norm(normals, axis=1)[:, np.newaxis]
+
+        no_ground = ((self.status[ix, iy] != CELL_GROUND)
+                     | (self.status[ix+1, iy] != CELL_GROUND)
+                     | (self.status[ix, iy+1] != CELL_GROUND)
+                     | (self.status[ix+1, iy+1] != CELL_GROUND))
+        z_coords[no_ground] = np.nan
+        normals[no_ground] = np.nan
+
+        return (z_coords, normals)
+
+    def __fill_cells(self, ix, iy, client):
+        if (len(ix) == 0):
+            return
+
+        xs = self.origin_x + (ix * self.resolution)
+        ys = self.origin_y + (iy * self.resolution)
+        z_coords, normals = raycast_utils.cast_ground_rays(xs, ys, client)
+
+        # The status is written last so that a reader on another thread never sees a cell marked as ground before its values are set
+        has_ground = ~np.isnan(z_coords)
+        self.heights[ix[has_ground], iy[has_ground]] = z_coords[has_ground]
+        self.normals[ix[has_ground], iy[has_ground]] = normals[has_ground]
+        self.status[ix, iy] = np.where(has_ground, CELL_GROUND, CELL_NO_GROUND)
+
+        self.is_dirty = True
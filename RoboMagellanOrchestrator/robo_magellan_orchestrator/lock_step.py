@@ -0,0 +1,65 @@
+import time
+
+import airsim
+
+import robo_magellan_orchestrator.run_clock as run_clock
+
+class LockStepper(object):
+    """ Advances a paused simulation in fixed steps of step_seconds.
+
+    The sim is paused by start(), and every step() lets it run for exactly step_seconds of sim time with
+    simContinueForTime(), waits until it has paused itself again, and advances the SimClock by one step. Whatever
+    runs between two steps (the controller, run_tick, telemetry) therefore sees the sim at fixed sim time intervals, no
+    matter how long it takes, and a run is reproducible from its seed. Give the orchestrator the stepper's clock so that
+    the runs are timed and scored in sim seconds.
+
+    Steps run as fast as the sim can compute them; sim_seconds_per_wall_second reports the achieved speed-up over real time.
+    """
+    def __init__(self, client, step_seconds=0.05, poll_seconds=0.001, clock=None):
+        if (step_seconds <= 0):
+            raise ValueError('step_seconds must be positive.')
+
+        self.client = client
+        self.step_seconds = step_seconds
+        self.poll_seconds = poll_seconds
+        self.clock = clock if clock is not None else run_clock.SimClock(step_seconds)
+        if (self.clock.step_seconds != step_seconds):
+            raise ValueError('The clock counts steps of {0} seconds, but the stepper takes steps of {1} seconds.'.format(self.clock.step_seconds, step_seconds))
+        self.clock.attach(self)
+        self.step_count = 0
+        self.wall_seconds = 0.0
+        self.last_step_wall_time = None
+
+    def start(self):
+        """ Pauses the sim. Call before the first step(). """
+        self.client.simPause(True)
+        self.last_step_wall_time = time.perf_counter()
+
+    def stop(self):
+        """ Lets the sim run freely again. """
+        self.client.simPause(False)
+        self.last_step_wall_time = None
+
+    def step(self):
+        """ Advances the sim by step_seconds, and the clock by one step. """
+        # simContinueForTime returns as soon as the sim is running, and the sim pauses itself once the time has elapsed
+        self.client.simContinueForTime(self.step_seconds)
+        while (not airsim.resolve_result(self.client.simIsPause())):
+            time.sleep(self.poll_seconds)
+
+        self.clock.advance()
+        self.step_count += 1
+
+        # The wall time between steps includes whatever ran in between, so this is the speed of the whole loop
+        now = time.perf_counter()
+        if (self.last_step_wall_time is not None):
+            self.wall_seconds += now - self.last_step_wall_time
+        self.last_step_wall_time = now
+
+    @property
+    def sim_seconds(self):
+        return self.step_count * self.step_seconds
+
+    @property
+    def sim_seconds_per_wall_second(self):
+        return (self.sim_seconds / self.wall_seconds) if self.wall_seconds > 0 else 0
@@ -0,0 +1,22 @@
+class ObjectRegistry(object):
+    """ Maps the names of the objects spawned into the world to the objects themselves.
+
+    Spawnable objects given the registry with set_object_registry add themselves when they are spawned and remove
+    themselves when they are deleted, so the object reported by a collision is found with a single lookup, however many
+    objects there are.
+    """
+    def __init__(self):
+        self.objects = {}
+
+    def register(self, object_name, spawned_object):
+        self.objects[object_name] = spawned_object
+
+    def unregister(self, object_name):
+        self.objects.pop(object_name, None)
+
+    def get(self, object_name):
+        """ Returns the object spawned with this name, or None if it is not a registered object. """
+        return self.objects.get(object_name)
+
+    def __len__(self):
+        return len(self.objects)
@@ -0,0 +1,240 @@
+import json
+
+import numpy as np
+import shapely.geometry.polygon
+
+import robo_magellan_orchestrator.polygon_utils as polygon_utils
+import robo_magellan_orchestrator.telemetry as telemetry
+
+class ScoringRules(object):
+    """ The parameters that runs are scored with. Each one that is None keeps the value the run was recorded with.
+
+    bonus_multipliers lists one multiplier per cone, in the order of the cones in the configuration. arena_bounds is a
+    list of (x, y) vertices.
+    """
+    def __init__(self, time_limit=None, end_run_on_collision=None, arena_bounds=None, position_tolerance=None, velocity_tolerance=None, bonus_multipliers=None):
+        self.time_limit = time_limit
+        self.end_run_on_collision = end_run_on_collision
+        self.arena_bounds = arena_bounds
+        self.position_tolerance = position_tolerance
+        self.velocity_tolerance = velocity_tolerance
+        self.bonus_multipliers = bonus_multipliers
+
+    @staticmethod
+    def from_config(config_values):
+        """ Takes the scoring parameters from the values of an orchestrator configuration file. The spawn settings are ignored. """
+        rules = ScoringRules()
+        if ('timeLimit' in config_values):
+            rules.time_limit = float(config_values['timeLimit'])
+        if ('endRunOnCollision' in config_values):
+            rules.end_run_on_collision = config_values['endRunOnCollision']
+        if ('arenaBounds' in config_values):
+            rules.arena_bounds = [(vertex['x'], vertex['y']) for vertex in config_values['arenaBounds']]
+        if ('goalPoint' in config_values):
+            if ('positionTolerance' in config_values['goalPoint']):
+                rules.position_tolerance = float(config_values['goalPoint']['positionTolerance'])
+            if ('velocityTolerance' in config_values['goalPoint']):
+                rules.velocity_tolerance = float(config_values['goalPoint']['velocityTolerance'])
+        if ('cones' in config_values):
+            rules.bonus_multipliers = [cone['bonusMultiplier'] for cone in config_values['cones']]
+
+        return rules
+
+    @staticmethod
+    def from_config_file(config_file_path):
+        with open(config_file_path, 'r') as f:
+            return ScoringRules.from_config(json.load(f))
+
+def rescore_runs(records, runs, rules=None):
+    """ Scores recorded runs again under new rules, without a simulator.
+
+    records and runs are as returned by telemetry.read_telemetry, and runs may be any subset of the recorded runs, which
+    should leave out the aborted ones (their records stop wherever the run failed, and a retry is recorded again). The
+    checks of run_tick are replayed over the recorded ticks of all the runs at once: a run ends on the first tick that
+    exceeds the time limit, is out of bounds, hits the goal cone or a foreign object, or is at the goal, and the checks of
+    that tick are resolved in the same order as run_tick does. The tick that exceeds the time limit ends the run before the
+    vehicle state is captured, so it is not recorded; a run that timed out is taken to have had one more tick at its
+    recorded runTimeSeconds. A run that does not end within its recorded ticks (e.g. a longer time limit, or a tighter
+    goal tolerance than the recording stopped at) is reported as not complete.
+
+    Returns a dict of per-run arrays (lists for the strings), in the order of runs.
+    """
+    if (rules is None):
+        rules = ScoringRules()
+
+    num_runs = len(runs)
+    num_cones = np.array([len(run['cones']) for run in runs], dtype=np.int64)
+    first_records = np.array([run['firstRecord'] for run in runs], dtype=np.int64)
+    record_counts = np.array([run['numRecords'] for run in runs], dtype=np.int64)
+
+    # The records of the runs are gathered into one block, where the records of run i are at starts[i]:ends[i]
+    ends = np.cumsum(record_counts)
+    starts = ends - record_counts
+    num_records = int(ends[-1]) if num_runs > 0 else 0
+    record_runs = np.repeat(np.arange(num_runs), record_counts)
+    data = records[(np.arange(num_records) - starts[record_runs]) + first_records[record_runs]]
+
+    time_limits = np.array([rules.time_limit if rules.time_limit is not None else run['timeLimit'] for run in runs], dtype=np.float64)
+    end_run_on_collision = np.array([rules.end_run_on_collision if rules.end_run_on_collision is not None else run['endRunOnCollision'] for run in runs], dtype=bool)
+    position_tolerances = np.array([rules.position_tolerance if rules.position_tolerance is not None else run['goal']['positionTolerance'] for run in runs], dtype=np.float64)
+    velocity_tolerances = np.array([rules.velocity_tolerance if rules.velocity_tolerance is not None else run['goal']['velocityTolerance'] for run in runs], dtype=np.float64)
+    goal_centers = np.array([[run['goal']['x'], run['goal']['y'], run['goal']['z']] for run in runs], dtype=np.float64).reshape(-1, 3)
+    goal_objects = np.where([run['goal']['name'] is not None for run in runs], num_cones, -1)
+
+    # The multipliers of run i's cones are at cone_offsets[i]:cone_offsets[i] + num_cones[i]
+    cone_offsets = np.cumsum(num_cones) - num_cones
+    multipliers = []
+    for run in runs:
+        if (rules.bonus_multipliers is None):
+            multipliers.extend(cone['bonusMultiplier'] for cone in run['cones'])
+        elif (len(rules.bonus_multipliers) != len(run['cones'])):
+            raise ValueError('Run {0} has {1} cones, but {2} bonus multipliers were given.'.format(run['runIndex'], len(run['cones']), len(rules.bonus_multipliers)))
+        else:
+            multipliers.extend(rules.bonus_multipliers)
+    multipliers = np.array(multipliers, dtype=np.float64)
+
+    # Per record checks
+    elapsed_seconds = data['elapsed_seconds']
+    late = elapsed_seconds > time_limits[record_runs]
+    out_of_bounds = ~_contains_many(data, runs, record_runs, rules.arena_bounds)
+
+    collision_objects = data['collision_object']
+    hit = collision_objects != telemetry.NO_COLLISION
+    cone_hit = hit & (collision_objects < num_cones[record_runs])
+    goal_hit = hit & (collision_objects == goal_objects[record_runs])
+    foreign_hit = hit & ~cone_hit & ~goal_hit & end_run_on_collision[record_runs]
+
+    dx = data['x'] - goal_centers[record_runs, 0]
+    dy = data['y'] - goal_centers[record_runs, 1]
+    dz = data['z'] - goal_centers[record_runs, 2]
+    vx = data['vx'].astype(np.float64)
+    vy = data['vy'].astype(np.float64)
+    vz = data['vz'].astype(np.float64)
+    at_goal = ((((dx * dx) + (dy * dy) + (dz * dz)) <= np.square(position_tolerances)[record_runs])
+               & (((vx * vx) + (vy * vy) + (vz * vz)) <= np.square(velocity_tolerances)[record_runs]))
+
+    # The first ending tick of every run
+    ending_ticks = np.flatnonzero(late | out_of_bounds | goal_hit | foreign_hit | at_goal)
+    if (len(ending_ticks) > 0):
+        first_ending = np.searchsorted(ending_ticks, starts)
+        end_ticks = ending_ticks[np.minimum(first_ending, len(ending_ticks) - 1)]
+        run_complete = (first_ending < len(ending_ticks)) & (end_ticks < ends)
+    else:
+        end_ticks = starts.copy()
+        run_complete = np.zeros(num_runs, dtype=bool)
+    end_ticks = np.where(run_complete, end_ticks, ends - 1)
+    safe_end_ticks = np.clip(end_ticks, 0, max(num_records - 1, 0))
+
+    # The time limit is checked before anything else, so a late tick is not evaluated at all
+    timed_out = run_complete & late[safe_end_ticks] if num_records > 0 else run_complete
+    last_evaluated_ticks = np.where(timed_out, end_ticks - 1, end_ticks)
+
+    # A run that timed out has an unrecorded last tick at its recorded run time, which ends it if it is still late
+    recorded_timeouts = np.array([run.get('runEndReason') == 'time limit exceeded.' for run in runs], dtype=bool)
+    recorded_run_times = np.array([run['runTimeSeconds'] if recorded_timeouts[i] else np.nan for i, run in enumerate(runs)], dtype=np.float64)
+    timed_out_after_records = ~run_complete & recorded_timeouts & (recorded_run_times > time_limits)
+    run_complete = run_complete | timed_out_after_records
+    timed_out = timed_out | timed_out_after_records
+
+    tick_indices = np.arange(num_records)
+    valid_cone_hits = np.flatnonzero(cone_hit & (tick_indices <= last_evaluated_ticks[record_runs]))
+    visited_cones, first_hits = np.unique(cone_offsets[record_runs[valid_cone_hits]] + collision_objects[valid_cone_hits], return_index=True)
+    visited_cone_runs = record_runs[valid_cone_hits[first_hits]]
+
+    cones_visited = np.bincount(visited_cone_runs, minlength=num_runs)
+    score_multipliers = np.ones(num_runs, dtype=np.float64)
+    np.multiply.at(score_multipliers, visited_cone_runs, multipliers[visited_cones])
+
+    if (num_records > 0):
+        goal_visited = run_complete & ~timed_out & (goal_hit[safe_end_ticks] | (at_goal[safe_end_ticks] & ~foreign_hit[safe_end_ticks]))
+        run_time_seconds = np.where(run_complete, elapsed_seconds[safe_end_ticks], np.nan)
+    else:
+        goal_visited = np.zeros(num_runs, dtype=bool)
+        run_time_seconds = np.full(num_runs, np.nan)
+    run_time_seconds = np.where(timed_out_after_records, recorded_run_times, run_time_seconds)
+
+    run_end_reasons = []
+    for i in range(0, num_runs, 1):
+        run_end_reasons.append(_get_run_end_reason(runs[i], run_complete[i], timed_out[i], safe_end_ticks[i], out_of_bounds, goal_hit, foreign_hit, at_goal, collision_objects))
+
+    results = {}
+    results['runIndex'] = np.array([run['runIndex'] for run in runs], dtype=np.int64)
+    results['seed'] = [run['seed'] for run in runs]
+    results['runComplete'] = run_complete
+    results['runEndReason'] = run_end_reasons
+    results['runTimeSeconds'] = run_time_seconds
+    results['score'] = np.where(goal_visited, run_time_seconds * score_multipliers, 0.0)
+    results['goalVisited'] = goal_visited
+    results['conesVisited'] = cones_visited
+
+    return results
+
+def rescore_telemetry_file(file_path, rules=None):
+    """ Scores all the runs of a telemetry file again under new rules, except the aborted ones. """
+    records, runs = telemetry.read_telemetry(file_path)
+    runs = [run for run in runs if not run.get('aborted', False)]
+    return rescore_runs(records, runs, rules)
+
+def compare_with_recorded(results, runs):
+    """ Checks that results of rescore_runs under the rules the runs were recorded with (rules=None) agree with the recording.
+
+    Every run is expected to end for the same reason, at the same time, with the same cones, goal and score as run_tick
+    decided when it was recorded. Returns one (runIndex, field, recorded value, replayed value) tuple per disagreement.
+    """
+    mismatches = []
+    for i, run in enumerate(runs):
+        recorded = {}
+        recorded['runComplete'] = run.get('runEndReason') is not None
+        recorded['runEndReason'] = run.get('runEndReason')
+        recorded['runTimeSeconds'] = run.get('runTimeSeconds')
+        recorded['score'] = run.get('score', 0)
+        recorded['goalVisited'] = run.get('goalVisitedTimeStamp') is not None
+        recorded['conesVisited'] = sum(1 for time_stamp in run.get('coneVisitedTimeStamps', []) if time_stamp is not None)
+
+        for field, recorded_value in recorded.items():
+            replayed_value = results[field][i]
+            if (field in ('runTimeSeconds', 'score')):
+                if (recorded_value is None):
+                    agree = np.isnan(replayed_value)
+                else:
+                    agree = np.isclose(recorded_value, replayed_value)
+            else:
+                agree = (recorded_value == replayed_value)
+
+            if (not agree):
+                mismatches.append((run['runIndex'], field, recorded_value, replayed_value.item() if hasattr(replayed_value, 'item') else replayed_value))
+
+    return mismatches
+
+def _contains_many(data, runs, record_runs, arena_bounds):
+    if (arena_bounds is not None):
+        return polygon_utils.PreparedPolygon(shapely.geometry.polygon.Polygon(arena_bounds)).contains_many(data['x'], data['y'])
+
+    # Runs recorded with the same bounds are checked together
+    runs_by_bounds = {}
+    for i, run in enumerate(runs):
+        runs_by_bounds.setdefault(tuple(tuple(vertex) for vertex in run['arenaBounds']), []).append(i)
+
+    inside = np.zeros(len(data), dtype=bool)
+    for bounds, run_indices in runs_by_bounds.items():
+        prepared_bounds = polygon_utils.PreparedPolygon(shapely.geometry.polygon.Polygon(bounds))
+        if (len(runs_by_bounds) == 1):
+            return prepared_bounds.contains_many(data['x'], data['y'])
+
+        mask = np.isin(record_runs, run_indices)
+        inside[mask] = prepared_bounds.contains_many(data['x'][mask], data['y'][mask])
+
+    return inside
+
+def _get_run_end_reason(run, run_complete, timed_out, end_tick, out_of_bounds, goal_hit, foreign_hit, at_goal, collision_objects):
+    if (not run_complete):
+        return None
+    if (timed_out):
+        return 'time limit exceeded.'
+
+    # run_tick ends the run once per check that fails, so the last one wins, and a foreign collision skips the goal check
+    if (foreign_hit[end_tick]):
+        return 'collision with {0}.'.format(run['objectNames'][collision_objects[end_tick]])
+    if (goal_hit[end_tick] or at_goal[end_tick]):
+        return 'goal reached.'
+    return 'out of bounds.'
@@ -0,0 +1,149 @@
+import numpy as np
+import shapely
+import shapely.geometry
+import shapely.geometry.polygon
+
+class PolygonSampler(object):
+    """ Draws points uniformly from the inside of a simple polygon.
+
+    The polygon is triangulated once. A sample picks a triangle with probability proportional to its area,
+    then a uniform point inside that triangle, so every sample is valid regardless of the polygon's shape.
+    """
+    def __init__(self, polygon):
+        if (len(polygon.interiors) > 0):
+            raise ValueError('Polygons with holes are not supported for sampling.')
+        if (polygon.area <= 0):
+            raise ValueError('Polygon encloses zero area: {0}.'.format(polygon.wkt))
+        if (not polygon.is_valid):
+            raise ValueError('Polygon is not simple (its edges cross each other): {0}.'.format(polygon.wkt))
+
+        self.triangles = triangulate_polygon(polygon)
+
+        edge_1 = self.triangles[:, 1, :] - self.triangles[:, 0, :]
+        edge_2 = self.triangles[:, 2, :] - self.triangles[:, 0, :]
+        areas = 0.5 * np.abs((edge_1[:, 0] * edge_2[:, 1]) - (edge_1[:, 1] * edge_2[:, 0]))
+        self.cumulative_areas = np.cumsum(areas)
+
+    def sample(self, random_state=None):
+        point = self.sample_n(1, random_state)[0]
+        return (float(point[0]), float(point[1]))
+
+    def sample_n(self, k, random_state=None):
+        """ Returns a (k, 2) array of points inside the polygon. Uses the global NumPy random state unless one is given. """
+        if (random_state is None):
+            random_state = np.random
+
+        triangle_indices = np.searchsorted(self.cumulative_areas, random_state.random_sample(k) * self.cumulative_areas[-1], side='right')
+        triangle_indices = np.minimum(triangle_indices, len(self.cumulative_areas) - 1)
+        triangles = self.triangles[triangle_indices]
+
+        # Reflect samples from the far half of the unit square back into the triangle
+        r = random_state.random_sample((k, 2))
+        outside = (r[:, 0] + r[:, 1]) > 1
+        r[outside] = 1 - r[outside]
+
+        return (triangles[:, 0, :]
+                + (r[:, 0:1] * (triangles[:, 1, :] - triangles[:, 0, :]))
+                + (r[:, 1:2] * (triangles[:, 2, :] - triangles[:, 0, :])))
+
+class PreparedPolygon(object):
+    """ Point-in-polygon test against a fixed polygon, precomputed for being called at a high rate.
+
+    The edges are stored as flat tuples of floats so that contains() does not allocate any geometry.
+    Points exactly on the boundary may be reported either way.
+    """
+    def __init__(self, polygon):
+        self.polygon = polygon
+        self.min_x, self.min_y, self.max_x, self.max_y = polygon.bounds
+
+        # (y_start, y_end, x_start, dx_dy) for every non-horizontal edge of every ring
+        rings = [polygon.exterior] + list(polygon.interiors)
+        edges = []
+        for ring in rings:
+            coords = list(ring.coords)
+            for i in range(0, len(coords) - 1, 1):
+                x1, y1 = coords[i][0], coords[i][1]
+                x2, y2 = coords[i+1][0], coords[i+1][1]
+                if (y1 != y2):
+                    edges.append((y1, y2, x1, (x2 - x1) / (y2 - y1)))
+
+        self.edges = tuple(edges)
+        self.edge_table = np.array(edges, dtype=np.float64).reshape(-1, 4)
+
+    def contains(self, x, y):
+        if (x < self.min_x or x > self.max_x or y < self.min_y or y > self.max_y):
+            return False
+
+        # Even-odd rule: count the edges crossed by a ray going from the point towards +x
+        inside = False
+        for y1, y2, x1, dx_dy in self.edges:
+            if ((y1 > y) != (y2 > y)) and (x < x1 + ((y - y1) * dx_dy)):
+                inside = not inside
+
+        return inside
+
+    def contains_many(self, xs, ys):
+        """ Vectorized contains() over arrays of points, e.g. a whole recorded trajectory. Returns a boolean array. """
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        inside = np.zeros(xs.shape, dtype=bool)
+
+        for y1, y2, x1, dx_dy in self.edge_table:
+            crosses = ((y1 > ys) != (y2 > ys)) & (xs < x1 + ((ys - y1) * dx_dy))
+            inside ^= crosses
+
+        return inside
+
+def triangulate_polygon(polygon):
+    """ Ear-clipping triangulation of a simple polygon. Returns an (N, 3, 2) array of triangle vertices. """
+    polygon = shapely.geometry.polygon.orient(polygon, sign=1.0)
+    vertices = np.array(polygon.exterior.coords[:-1], dtype=np.float64)
+
+    remaining = list(range(0, len(vertices), 1))
+    triangles = []
+    while (len(remaining) > 3):
+        ear_idx = _find_ear(vertices, remaining)
+        if (ear_idx is None):
+            # Only collinear vertices are left to clip; they contribute no area
+            ear_idx = _find_min_area_corner(vertices, remaining)
+        else:
+            triangles.append(_corner(vertices, remaining, ear_idx))
+        del remaining[ear_idx]
+
+    triangles.append(vertices[remaining])
+    triangles = np.array(triangles)
+
+    edge_1 = triangles[:, 1, :] - triangles[:, 0, :]
+    edge_2 = triangles[:, 2, :] - triangles[:, 0, :]
+    return triangles[((edge_1[:, 0] * edge_2[:, 1]) - (edge_1[:, 1] * edge_2[:, 0])) > 0]
+
+def _corner(vertices, remaining, i):
+    return vertices[[remaining[i - 1], remaining[i], remaining[(i + 1) % len(remaining)]]]
+
+def _cross(a, b, c):
+    return ((b[0] - a[0]) * (c[1] - a[1])) - ((b[1] - a[1]) * (c[0] - a[0]))
+
+def _find_ear(vertices, remaining):
+    for i in range(0, len(remaining), 1):
+        a, b, c = _corner(vertices, remaining, i)
+        if (_cross(a, b, c) <= 0):
+            continue
+
+        is_ear = True
+        for j in remaining:
+            if (j in (remaining[i - 1], remaining[i], remaining[(i + 1) % len(remaining)])):
+                continue
+
+            p = vertices[j]
+            if (_cross(a, b, p) >= 0 and _cross(b, c, p) >= 0 and _cross(c, a, p) >= 0):
+                is_ear = False
+                break
+
+        if (is_ear):
+            return i
+
+    return None
+
+def _find_min_area_corner(vertices, remaining):
+    areas = [abs(_cross(*_corner(vertices, remaining, i))) for i in range(0, len(remaining), 1)]
+    return int(np.argmin(areas))
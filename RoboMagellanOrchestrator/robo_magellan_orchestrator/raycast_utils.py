@@ -1,36 +1,83 @@
+import numpy as np
+
 import airsim
 import airsim.airsim_types as at
 
-def get_ground(x, y, client):
+def get_ground(x, y, client, ground_cache=None):
+    if (ground_cache is not None and ground_cache.contains(x, y)):
+        return ground_cache.get_ground(x, y, client)
+
+    return cast_ground_ray(x, y, client)
+
+def get_ground_batch(xs, ys, client, ground_cache=None):
+    """ Vectorized get_ground().
+
+    Returns an array of z coordinates and an (N, 3) array of normals. Points without a valid ground hit are NaN in both.
+    """
+    xs = np.asarray(xs, dtype=np.float64).ravel()
+    ys = np.asarray(ys, dtype=np.float64).ravel()
+
+    if (ground_cache is None):
+        return cast_ground_rays(xs, ys, client)
+
+    in_cache = ground_cache.contains_batch(xs, ys)
+    z_coords = np.empty(xs.shape[0], dtype=np.float64)
+    normals = np.empty((xs.shape[0], 3), dtype=np.float64)
+
+    z_coords[in_cache], normals[in_cache] = ground_cache.get_ground_batch(xs[in_cache], ys[in_cache], client)
+    z_coords[~in_cache], normals[~in_cache] = cast_ground_rays(xs[~in_cache], ys[~in_cache], client)
+
+    return (z_coords, normals)
+
+def cast_ground_ray(x, y, client):
+    response = airsim.resolve_result(client.simRayCast(_make_ground_ray_request(x, y)))
+    ground_hit = _find_ground_hit(response)
+
+    if (ground_hit is None):
+        return (None, None)
+
+    z_coord = ground_hit['hit_point']['z_val']
+    normal = at.Vector3r(x_val = ground_hit['hit_normal']['x_val'], y_val = ground_hit['hit_normal']['y_val'], z_val = ground_hit['hit_normal']['z_val'])
+
+    return (z_coord, normal)
+
+def cast_ground_rays(xs, ys, client, chunk_size=256):
+    num_points = len(xs)
+    z_coords = np.full(num_points, np.nan, dtype=np.float64)
+    normals = np.full((num_points, 3), np.nan, dtype=np.float64)
+
+    # Requests are pipelined in chunks so that a large batch does not queue an unbounded number of responses
+    for chunk_start in range(0, num_points, chunk_size):
+        chunk_end = min(chunk_start + chunk_size, num_points)
+        with client.batch():
+            futures = [client.simRayCast(_make_ground_ray_request(float(xs[i]), float(ys[i]))) for i in range(chunk_start, chunk_end, 1)]
+
+        for i, future in enumerate(futures, chunk_start):
+            ground_hit = _find_ground_hit(future.get())
+            if (ground_hit is not None):
+                z_coords[i] = ground_hit['hit_point']['z_val']
+                normals[i] = (ground_hit['hit_normal']['x_val'], ground_hit['hit_normal']['y_val'], ground_hit['hit_normal']['z_val'])
+
+    return (z_coords, normals)
+
+def _make_ground_ray_request(x, y):
     position = at.Vector3r(x_val = x, y_val = y, z_val = 10000)
     direction = at.Vector3r(x_val = 0, y_val = 0, z_val = -20000)
     through_blocking = True
     persist_seconds = 0
     reference_frame_link = ''
 
-    request = at.RayCastRequest(position, direction, reference_frame_link, through_blocking, persist_seconds)
-    
-    response = client.simRayCast(request)
+    return at.RayCastRequest(position, direction, reference_frame_link, through_blocking, persist_seconds)
 
-    ground_hit = None
-    ground_hit_idx = None
-    for i in range(0, len(response['hits']), 1):
-        hit = response['hits'][i]
+def _find_ground_hit(response):
+    for hit in response['hits']:
         actor_name = hit['collided_actor_name'].lower()
 
         # Do not allow spawns that are under water
         if ('water' in actor_name):
-            return (None, None)
+            return None
 
         if ('landscape' in actor_name or 'ground' in actor_name):
-            ground_hit = hit
-            ground_hit_idx = i
-            break
+            return hit
 
-    if (ground_hit is None):
-        return (None, None)
-
-    z_coord = ground_hit['hit_point']['z_val']
-    normal = at.Vector3r(x_val = ground_hit['hit_normal']['x_val'], y_val = ground_hit['hit_normal']['y_val'], z_val = ground_hit['hit_normal']['z_val'])
-
-    return (z_coord, normal)
+    return None
@@ -2,6 +2,7 @@ import datetime
 import sys
 import os
 import json
+import math
 import shapely
 import uuid
 import random
@@ -13,10 +14,17 @@ import airsim.airsim_types as at
 import robo_magellan_orchestrator.starting_position as starting_position
 import robo_magellan_orchestrator.cone_waypoint as cone_waypoint
 import robo_magellan_orchestrator.goal_waypoint as goal_waypoint
+import robo_magellan_orchestrator.ground_cache as ground_cache
+import robo_magellan_orchestrator.object_registry as object_registry
+import robo_magellan_orchestrator.polygon_utils as polygon_utils
 import robo_magellan_orchestrator.raycast_utils as raycast_utils
+import robo_magellan_orchestrator.run_clock as run_clock
+import robo_magellan_orchestrator.run_status as run_status
+import robo_magellan_orchestrator.spawnable_object as spawnable_object
+import robo_magellan_orchestrator.world_snapshot as world_snapshot
 
 class RoboMagellanCompetitionOrchestrator(object):
-    def __init__(self, config_file_path):
+    def __init__(self, config_file_path, clock=None):
         with open(config_file_path, 'r') as f:
             config_text = f.read()
         config_values = json.loads(config_text)
@@ -24,6 +32,7 @@ class RoboMagellanCompetitionOrchestrator(object):
         if ('arenaBounds' not in config_values):
             raise ValueError('"arenaBounds" not specified.')
         self.arena_bounds = self.__parse_arena_bounds(config_values['arenaBounds'])
+        self.prepared_arena_bounds = polygon_utils.PreparedPolygon(self.arena_bounds)
 
         if ('startPose' not in config_values):
             raise ValueError('"startPose" not specified.')
@@ -39,7 +48,7 @@ class RoboMagellanCompetitionOrchestrator(object):
 
         if ('timeLimit' not in config_values):
             raise ValueError('"timeLimit" not specified.')
-        self.time_limit = datetime.timedelta(seconds=float(config_values['timeLimit']))
+        self.time_limit_seconds = float(config_values['timeLimit'])
 
         self.debug_print_status = False
         if ('debugPrintStatus' in config_values):
@@ -57,20 +66,118 @@ class RoboMagellanCompetitionOrchestrator(object):
         if ('zOffset' in config_values):
             self.z_offset = float(config_values['zOffset'])
 
+        self.ground_cache = None
+        self.ground_cache_file_path = None
+        if ('groundCache' in config_values):
+            self.__init_ground_cache(config_values['groundCache'], os.path.dirname(os.path.abspath(config_file_path)))
+
+        if ('spawnPoolSize' in config_values):
+            for spawnable in self.__get_spawnable_objects():
+                spawnable.spawn_pool_size = int(config_values['spawnPoolSize'])
+        self.spawn_pool_refiller = None
+
+        # Run times come from the clock; the datetimes are kept for display only
+        self.clock = clock if clock is not None else run_clock.WallClock()
         self.start_time = None
         self.end_time = None
-        self.max_end_time = None
+        self.start_clock_mark = None
         self.last_collision_time_stamp = None
-        self.run_end_reason = None
+        self.last_tick_rpc_count = 0
+        self.last_snapshot = None
+        self.random_seed = None
+        self.telemetry_recorder = None
+        self.status = run_status.RunStatus()
+        self.observers = []
+
+        # A collision with a registered object is handed to the handler of its type; any other object is a foreign collision
+        self.object_registry = object_registry.ObjectRegistry()
+        self.goal_point.set_object_registry(self.object_registry)
+        for cone in self.cones:
+            cone.set_object_registry(self.object_registry)
+        self.collision_handlers = {cone_waypoint.ConeWaypoint: self.__on_cone_collision,
+                                   goal_waypoint.GoalWaypoint: self.__on_goal_collision}
+
+    @property
+    def run_complete(self):
+        return self.status.run_complete
+
+    @property
+    def run_end_reason(self):
+        return self.status.run_end_reason
+
+    @property
+    def elapsed_seconds(self):
+        return self.status.elapsed_seconds
+
+    @property
+    def run_time_seconds(self):
+        return self.status.run_time_seconds
+
+    def add_observer(self, observer):
+        """ Adds a run_status.RunObserver to be notified of the events of the runs. """
+        self.observers.append(observer)
+
+    def remove_observer(self, observer):
+        self.observers.remove(observer)
+
+    def set_clock(self, clock):
+        """ Sets the clock that times the runs, e.g. a run_clock.SimClock to score in sim time. Takes effect on the next run. """
+        self.clock = clock
+
+    def set_telemetry_recorder(self, telemetry_recorder):
+        """ Records every tick of the following runs with a telemetry.TelemetryRecorder, or stops recording if None. """
+        self.telemetry_recorder = telemetry_recorder
 
     def set_debug_draw_enabled(self, draw_debug):
         self.debug_draw = draw_debug
 
     def set_random_seed(self, random_seed):
+        self.random_seed = random_seed
         random.seed(random_seed)
         np.random.seed(random_seed)
 
+        # Pooled spawn points were drawn before the seed was set, so spawns no longer come from the pools
+        for spawnable in self.__get_spawnable_objects():
+            spawnable.is_seeded = random_seed is not None
+
+    def prefetch_ground_cache(self, client):
+        if (self.ground_cache is None):
+            return 0
+
+        num_raycasts = self.ground_cache.prefetch(client)
+        if (self.ground_cache.is_dirty and self.ground_cache_file_path is not None):
+            self.ground_cache.save(self.ground_cache_file_path)
+
+        return num_raycasts
+
+    def fill_spawn_pools(self, client):
+        for spawnable in self.__get_spawnable_objects():
+            spawnable.fill_spawn_pool(client)
+
+    def start_spawn_pool_refill(self, refill_client, random_seed=None):
+        self.stop_spawn_pool_refill()
+        self.spawn_pool_refiller = spawnable_object.SpawnPoolRefiller(self.__get_spawnable_objects(), refill_client, random_seed=random_seed)
+        self.spawn_pool_refiller.start()
+
+    def stop_spawn_pool_refill(self):
+        if (self.spawn_pool_refiller is not None):
+            self.spawn_pool_refiller.stop()
+            self.spawn_pool_refiller = None
+
+    def get_spawn_pool_statistics(self):
+        statistics = {}
+        statistics['startPose'] = self.__get_spawn_pool_statistics(self.start_pose)
+        statistics['goalPoint'] = self.__get_spawn_pool_statistics(self.goal_point)
+        statistics['cones'] = [self.__get_spawn_pool_statistics(cone) for cone in self.cones]
+
+        return statistics
+
     def start_new_run(self, client):
+        if (self.spawn_pool_refiller is not None and self.spawn_pool_refiller.error is not None):
+            raise self.spawn_pool_refiller.error
+
+        self.prefetch_ground_cache(client)
+
         self.goal_point.reset()
         self.goal_point.spawn(client)
         
@@ -87,76 +194,58 @@ class RoboMagellanCompetitionOrchestrator(object):
 
         client.simSetDrawableShapes(debug_draw_request)
 
+        # The sim keeps reporting the last collision of the previous run until a new one happens
+        self.last_collision_time_stamp = airsim.resolve_result(client.simGetCollisionInfo()).time_stamp
+
         self.start_time = datetime.datetime.utcnow()
         self.end_time = None
-        self.max_end_time = self.start_time + self.time_limit
-        self.run_complete = False
-        self.elapsed_seconds = 0
+        self.start_clock_mark = self.clock.mark()
+        self.status.reset()
+        self.last_snapshot = None
+
+        if (self.telemetry_recorder is not None):
+            self.telemetry_recorder.begin_run(self.__get_telemetry_run_info())
 
     def run_tick(self, client):
-        if (self.end_time != None or self.run_complete):
+        self.last_tick_rpc_count = 0
+        status = self.status
+        if (self.end_time != None or status.run_complete):
             return
 
-        now = datetime.datetime.utcnow()
-        self.elapsed_seconds = (now - self.start_time).seconds
-        if (now > self.max_end_time):
-            self.end_time = now
-            self.run_complete = True
-            self.run_end_reason = 'time limit exceeded.'
+        status.tick_count += 1
+        status.elapsed_seconds = self.get_elapsed_seconds()
+        if (status.elapsed_seconds > self.time_limit_seconds):
+            self.__end_run('time limit exceeded.')
+            self.__notify('on_time_limit_exceeded')
+            self.__notify('on_run_complete')
             return
 
-        pose = client.simGetVehiclePose()
-        pose_point = shapely.geometry.Point(pose.position.x_val, pose.position.y_val)
+        # Fetch the vehicle state once and share it with every check below
+        snapshot = world_snapshot.WorldSnapshot.capture(client)
+        self.last_snapshot = snapshot
+        self.last_tick_rpc_count = snapshot.rpc_count
 
-        if (not self.arena_bounds.contains(pose_point)):
-            self.end_time = now
-            self.run_complete = True
-            self.run_end_reason = 'out of bounds.'
+        collision_object_name = self.__check_snapshot(snapshot)
 
-        collision_info = client.simGetCollisionInfo()
-        if (collision_info.has_collided and collision_info.time_stamp != self.last_collision_time_stamp):
-            object_name = collision_info.object_name
-            collided_with_cone = False
-            
-            for cone in self.cones:
-                if cone.random_name == object_name:
-                    if not(cone.visited):
-                        cone.set_visited(self.elapsed_seconds)
-                    collided_with_cone = True
-
-            if (self.goal_point.cone_type != None):
-                if self.goal_point.random_name == object_name:
-                    if not (self.goal_point.visited):
-                        self.goal_point.set_visited(self.elapsed_seconds)
-                        self.end_time = now
-                        self.run_complete = True
-                        self.run_end_reason = 'goal reached.'
-
-            if not collided_with_cone and self.end_run_on_collision:
-                self.end_time = now
-                self.run_complete = True
-                self.run_end_reason = 'collision with {0}.'.format(object_name)
-                return
-
-        if (self.goal_point.is_bot_at_goal(client)):
-            if not (self.goal_point.visited):
-                self.goal_point.set_visited(self.elapsed_seconds)
-                self.end_time = now
-                self.run_complete = True
-                self.run_end_reason = 'goal reached.'
+        if (self.telemetry_recorder is not None):
+            self.telemetry_recorder.record(status.elapsed_seconds,
+                                           snapshot,
+                                           getattr(client, 'last_left_throttle', None),
+                                           getattr(client, 'last_right_throttle', None),
+                                           collision_object_name,
+                                           status.cones_visited,
+                                           status.goal_visited,
+                                           status.run_complete)
 
-    def get_run_score(self, client):
-        if (not self.run_complete 
-            or self.end_time is None
-            or not self.goal_point.visited):
-            return 0
+        if (status.run_complete):
+            self.__notify('on_run_complete')
 
-        starting_score = (self.end_time - self.start_time).seconds
-        for cone in self.cones:
-            if (cone.visited):
-                starting_score = starting_score * cone.bonus_multiplier
+    def get_elapsed_seconds(self):
+        """ Run time so far according to the clock, in seconds. """
+        return self.clock.seconds_since(self.start_clock_mark)
 
-        return starting_score
+    def get_run_score(self, client):
+        return self.status.score
 
     def get_run_summary(self, client):
         now = datetime.datetime.utcnow()
@@ -166,7 +255,7 @@ class RoboMagellanCompetitionOrchestrator(object):
         summary['runStartTime'] = self.start_time
         summary['runEndTime'] = self.end_time
         summary['now'] = now
-        summary['elapsedTime'] = (now - self.start_time).seconds
+        summary['elapsedTime'] = self.get_elapsed_seconds()
         summary['score'] = self.get_run_score(client)
         summary['runEndReason'] = self.run_end_reason
 
@@ -197,7 +286,7 @@ class RoboMagellanCompetitionOrchestrator(object):
         summary_text += 'Summary \n'
         summary_text += 'Current time: {0}.\n'.format(summary['now'])
         summary_text += 'RunStartTime: {0}.\n'.format(summary['runStartTime'])
-        summary_text += 'Elapsed time: {0} seconds.\n'.format(summary['elapsedTime'])
+        summary_text += 'Elapsed time: {0:.3f} seconds.\n'.format(summary['elapsedTime'])
 
         if (summary['runComplete']):
             summary_text += 'RunEndTime: {0}.\n Score: {1:.4f}\nRun End Reason: {2}'.format(summary['runEndTime'], summary['score'], summary['runEndReason'])
@@ -232,10 +321,127 @@ class RoboMagellanCompetitionOrchestrator(object):
 
         return summary_text
 
-    def clean_up_run(self, client):
+    def clean_up_run(self, client, keep_objects=False):
+        # Keeping the objects lets the next start_new_run move them into place instead of spawning them again
+        if (keep_objects):
+            return
+
         for cone in self.cones:
             cone.delete(client)
 
+        self.goal_point.delete(client)
+
+    def __check_snapshot(self, snapshot):
+        """ Updates the run with the vehicle state of a tick. Returns the name of the object hit since the last tick, if any. """
+        status = self.status
+        pose = snapshot.pose
+        new_collision_object_name = None
+
+        if (not self.prepared_arena_bounds.contains(pose.position.x_val, pose.position.y_val)):
+            self.__end_run('out of bounds.')
+            self.__notify('on_out_of_bounds')
+
+        collision_info = snapshot.collision_info
+        if (collision_info.has_collided and collision_info.time_stamp != self.last_collision_time_stamp):
+            self.last_collision_time_stamp = collision_info.time_stamp
+            object_name = collision_info.object_name
+            new_collision_object_name = object_name
+
+            spawned_object = self.object_registry.get(object_name)
+            collision_handler = self.collision_handlers.get(type(spawned_object)) if spawned_object is not None else None
+            if (collision_handler is not None):
+                collision_handler(spawned_object)
+            else:
+                # The run is ended first, so that observers see the status it ended with
+                if (self.end_run_on_collision):
+                    self.__end_run('collision with {0}.'.format(object_name))
+                self.__notify('on_collision', object_name)
+                if (self.end_run_on_collision):
+                    return new_collision_object_name
+
+        if (self.goal_point.is_bot_at_goal(snapshot)):
+            if not (self.goal_point.visited):
+                self.__visit_goal()
+
+        return new_collision_object_name
+
+    def __on_cone_collision(self, cone):
+        if not (cone.visited):
+            cone.set_visited(self.status.elapsed_seconds)
+            self.status.cones_visited += 1
+            self.__notify('on_cone_visited', cone)
+
+    def __on_goal_collision(self, goal_point):
+        if not (goal_point.visited):
+            self.__visit_goal()
+
+    def __visit_goal(self):
+        self.goal_point.set_visited(self.status.elapsed_seconds)
+        self.status.goal_visited = True
+        self.__end_run('goal reached.')
+        self.__notify('on_goal_reached')
+
+    def __notify(self, event_name, *args):
+        for observer in self.observers:
+            getattr(observer, event_name)(self, *args)
+
+    def __end_run(self, run_end_reason):
+        status = self.status
+        self.end_time = datetime.datetime.utcnow()
+        status.run_time_seconds = status.elapsed_seconds
+        status.run_complete = True
+        status.run_end_reason = run_end_reason
+        status.score = self.__compute_score()
+
+        if (self.telemetry_recorder is not None):
+            run_results = {}
+            run_results['runEndReason'] = status.run_end_reason
+            run_results['runTimeSeconds'] = status.run_time_seconds
+            run_results['score'] = status.score
+            run_results['coneVisitedTimeStamps'] = [cone.visited_time_stamp for cone in self.cones]
+            run_results['goalVisitedTimeStamp'] = self.goal_point.visited_time_stamp
+            self.telemetry_recorder.end_run(run_results)
+
+    def __compute_score(self):
+        if (not self.goal_point.visited):
+            return 0
+
+        score = self.status.run_time_seconds
+        for cone in self.cones:
+            if (cone.visited):
+                score = score * cone.bonus_multiplier
+
+        return score
+
+    def __get_telemetry_run_info(self):
+        # Everything needed to score the run again from its records
+        run_info = {}
+        run_info['seed'] = self.random_seed
+        run_info['timeLimit'] = self.time_limit_seconds
+        run_info['endRunOnCollision'] = self.end_run_on_collision
+        run_info['arenaBounds'] = [[x, y] for x, y in self.arena_bounds.exterior.coords]
+
+        run_info['cones'] = []
+        for cone in self.cones:
+            position = cone.spawn_pose.position
+            run_info['cones'].append({'name': cone.random_name, 'x': position.x_val, 'y': position.y_val, 'z': position.z_val, 'bonusMultiplier': cone.bonus_multiplier})
+
+        # The tolerances are stored squared
+        goal_center = self.goal_point.goal_center
+        run_info['goal'] = {}
+        run_info['goal']['name'] = self.goal_point.random_name if self.goal_point.cone_type is not None else None
+        run_info['goal']['x'] = goal_center.x_val
+        run_info['goal']['y'] = goal_center.y_val
+        run_info['goal']['z'] = goal_center.z_val
+        run_info['goal']['positionTolerance'] = math.sqrt(self.goal_point.position_tolerance)
+        run_info['goal']['velocityTolerance'] = math.sqrt(self.goal_point.velocity_tolerance)
+
+        run_info['objectNames'] = [cone.random_name for cone in self.cones]
+        if (run_info['goal']['name'] is not None):
+            run_info['objectNames'].append(run_info['goal']['name'])
+
+        return run_info
+
     def __parse_arena_bounds(self, arena_bounds_config):
         arena_bounds_vertices = []
         for vertex in arena_bounds_config:
@@ -243,6 +449,35 @@ class RoboMagellanCompetitionOrchestrator(object):
 
         return shapely.geometry.polygon.Polygon(arena_bounds_vertices)
 
+    def __get_spawnable_objects(self):
+        return [self.start_pose, self.goal_point] + self.cones
+
+    def __get_spawn_pool_statistics(self, spawnable):
+        statistics = {}
+        statistics['poolSize'] = len(spawnable.spawn_pool)
+        statistics['exhaustedCount'] = spawnable.spawn_pool_exhausted_count
+
+        return statistics
+
+    def __init_ground_cache(self, ground_cache_config, config_directory):
+        resolution = float(ground_cache_config.get('resolution', 0.5))
+
+        spawnable_objects = self.__get_spawnable_objects()
+        bounds_geometry = [self.arena_bounds] + [spawnable.get_spawn_bounds_geometry() for spawnable in spawnable_objects]
+        self.ground_cache = ground_cache.GroundCache.from_polygons(bounds_geometry, resolution)
+
+        if ('file' in ground_cache_config):
+            self.ground_cache_file_path = os.path.join(config_directory, ground_cache_config['file'])
+
+            # A cache saved for a different grid cannot be reused, so it is rebuilt from scratch
+            if (os.path.exists(self.ground_cache_file_path)):
+                saved_cache = ground_cache.GroundCache.load(self.ground_cache_file_path)
+                if (saved_cache.has_same_grid(self.ground_cache)):
+                    self.ground_cache = saved_cache
+
+        for spawnable in spawnable_objects:
+            spawnable.set_ground_cache(self.ground_cache)
+
     def __parse_cones(self, cones_config):
         cones = []
         for cone_config in cones_config:
@@ -260,7 +495,7 @@ class RoboMagellanCompetitionOrchestrator(object):
 
         # Cone spawn bounds
         for cone in self.cones:
-            cone_z, _ = raycast_utils.get_ground(cone.spawn_pose.position.x_val, cone.spawn_pose.position.y_val, client)
+            cone_z, _ = raycast_utils.get_ground(cone.spawn_pose.position.x_val, cone.spawn_pose.position.y_val, client, self.ground_cache)
             shapes = client.addDrawableShapeLine(shapes, 
                                                  str(uuid.uuid4()),
                                                  '',
@@ -281,7 +516,7 @@ class RoboMagellanCompetitionOrchestrator(object):
 
         # Goal pose
         # Do raycast to get normal to determine how to orient the circle
-        goal_pose_z, normal = raycast_utils.get_ground(self.goal_point.spawn_pose.position.x_val, self.goal_point.spawn_pose.position.y_val, client)
+        goal_pose_z, normal = raycast_utils.get_ground(self.goal_point.spawn_pose.position.x_val, self.goal_point.spawn_pose.position.y_val, client, self.ground_cache)
         shapes = client.addDrawableShapeCircle(shapes, 
                                                str(uuid.uuid4()),
                                                '',
@@ -320,7 +555,7 @@ class RoboMagellanCompetitionOrchestrator(object):
 
         # Spawn pose
         # Do raycast to get normal to determine how to orient the circle
-        spawn_z, normal = raycast_utils.get_ground(self.start_pose.spawn_pose.position.x_val, self.start_pose.spawn_pose.position.y_val, client)
+        spawn_z, normal = raycast_utils.get_ground(self.start_pose.spawn_pose.position.x_val, self.start_pose.spawn_pose.position.y_val, client, self.ground_cache)
         shapes = client.addDrawableShapeCircle(shapes, 
                                                str(uuid.uuid4()),
                                                '',
@@ -346,13 +581,14 @@ class RoboMagellanCompetitionOrchestrator(object):
     def __build_debug_polygon(self, polygon, color_rgba, existing_shapes, client, spacing=0.3, num=3, thickness=40):
         # The first and last point will be the same
         polygon_coords = list(polygon.exterior.coords)
+        polygon_z, _ = raycast_utils.get_ground_batch([p[0] for p in polygon_coords], [p[1] for p in polygon_coords], client, self.ground_cache)
 
         for i in range(0, len(polygon_coords) - 1, 1):
             first_point = polygon_coords[i]
             second_point = polygon_coords[i+1]
 
-            first_point_z, _ = raycast_utils.get_ground(first_point[0], first_point[1], client)
-            second_point_z, _ = raycast_utils.get_ground(second_point[0], second_point[1], client)
+            first_point_z = float(polygon_z[i])
+            second_point_z = float(polygon_z[i+1])
 
             existing_shapes = client.addDrawableShapeLine(existing_shapes,
                                                             str(uuid.uuid4()),
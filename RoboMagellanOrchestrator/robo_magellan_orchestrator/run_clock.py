@@ -0,0 +1,49 @@
+import time
+
+class WallClock(object):
+    """ Measures the run time with the host clock. Scores then depend on how fast the host runs the sim.
+
+    mark() returns the current reading, and seconds_since(mark) the seconds that have passed since then.
+    """
+    def mark(self):
+        return time.perf_counter()
+
+    def seconds_since(self, mark):
+        return time.perf_counter() - mark
+
+class SimClock(object):
+    """ Measures the run time in simulated seconds, in fixed steps of step_seconds.
+
+    The UrdfBot APIs do not report the current sim time, so the clock is driven by whoever drives the sim: a
+    lock_step.LockStepper that advances the sim with simContinueForTime(step_seconds) attaches itself to the clock and
+    calls advance() once per step. A clock without a driver would never reach the time limit, so it cannot be read.
+
+    The time is counted in whole steps and only converted to seconds when it is read, so the time of a run does not
+    depend on how many steps the clock took before the run started.
+    """
+    def __init__(self, step_seconds):
+        self.step_seconds = step_seconds
+        self.step_count = 0
+        self.driver = None
+
+    def attach(self, driver):
+        self.driver = driver
+
+    def advance(self):
+        self.step_count += 1
+
+    @property
+    def sim_seconds(self):
+        return self.step_count * self.step_seconds
+
+    def mark(self):
+        self.__check_driver()
+        return self.step_count
+
+    def seconds_since(self, mark):
+        self.__check_driver()
+        return (self.step_count - mark) * self.step_seconds
+
+    def __check_driver(self):
+        if (self.driver is None):
+            raise RuntimeError('The SimClock has no driver, so it would never advance. Use the clock of a lock_step.LockStepper.')
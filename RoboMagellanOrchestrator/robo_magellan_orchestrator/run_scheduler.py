@@ -0,0 +1,226 @@
+import collections
+import csv
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import traceback
+
+import rm_bot_client.rm_bot_client as rm_bot_client
+import robo_magellan_orchestrator.robo_magellan_orchestrator as robo_magellan_orchestrator
+import robo_magellan_orchestrator.batch_runner as batch_runner
+import robo_magellan_orchestrator.telemetry as telemetry
+
+RETRY_BACKOFF_SECONDS = 1.0
+MAX_RETRY_BACKOFF_SECONDS = 30.0
+
+# A worker's client gives up on a call after this long, and reconnects a few times before the run is failed
+RPC_TIMEOUT_SECONDS = 60
+MAX_RECONNECT_ATTEMPTS = 3
+
+# How often the scheduler checks that its workers are still alive while it waits for results
+WORKER_POLL_SECONDS = 1.0
+
+class ParallelRunScheduler(object):
+    """ Distributes competition runs over several simulator instances.
+
+    Each endpoint is an (ip, port) pair served by its own worker, which owns one client and one orchestrator and runs
+    its share of the seeds back to back. A run that raises is retried, possibly on another worker, up to max_retries
+    times; the worker that failed reconnects before taking its next run. A worker that dies in the middle of a run fails
+    that run in the same way, and if all the workers have died, the runs that are left are reported as failures.
+
+    Workers are processes by default. The controller_factory must then be picklable (e.g. a module-level function or
+    class), and it is called once in every worker to build that worker's controller. Thread workers share the global
+    NumPy random state, so their spawns are not reproducible from the seed.
+
+    With a telemetry_file_path, each worker records its runs to its own file, named after telemetry_file_path with the
+    index of the worker appended (see get_worker_telemetry_file_path).
+    """
+    def __init__(self, config_file_path, endpoints, controller_factory, max_retries=2, use_processes=True, step_seconds=None, telemetry_file_path=None):
+        if (len(endpoints) == 0):
+            raise ValueError('At least one simulator endpoint must be specified.')
+
+        self.config_file_path = config_file_path
+        self.endpoints = list(endpoints)
+        self.controller_factory = controller_factory
+        self.max_retries = max_retries
+        self.use_processes = use_processes
+        self.step_seconds = step_seconds
+        self.telemetry_file_path = telemetry_file_path
+
+    def run(self, seeds, results_file_path=None, results_format='jsonl'):
+        """ Runs one competition run per seed and returns the merged statistics of all workers. """
+        if (results_format not in ('jsonl', 'csv')):
+            raise ValueError('Unrecognized results_format: {0}. Valid options are "jsonl" and "csv".'.format(results_format))
+
+        if (self.use_processes):
+            task_queue = multiprocessing.Queue()
+            result_queue = multiprocessing.Queue()
+            workers = [multiprocessing.Process(target=run_worker, args=(index, endpoint, self.config_file_path, self.controller_factory, task_queue, result_queue, self.step_seconds, self.__get_telemetry_file_path(index))) for index, endpoint in enumerate(self.endpoints)]
+        else:
+            task_queue = queue.Queue()
+            result_queue = queue.Queue()
+            workers = [threading.Thread(target=run_worker, args=(index, endpoint, self.config_file_path, self.controller_factory, task_queue, result_queue, self.step_seconds, self.__get_telemetry_file_path(index))) for index, endpoint in enumerate(self.endpoints)]
+
+        seeds = list(seeds)
+        for seed in seeds:
+            task_queue.put((seed, 0))
+
+        results_file = None
+        csv_writer = None
+        if (results_file_path is not None):
+            results_file = open(results_file_path, 'w', newline='')
+            if (results_format == 'csv'):
+                csv_writer = csv.DictWriter(results_file, fieldnames=['endpoint'] + batch_runner.RESULT_FIELDS)
+                csv_writer.writeheader()
+
+        start_time = time.perf_counter()
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+
+        results = []
+        failures = []
+        try:
+            pending_seeds = collections.Counter(seeds)
+            num_pending = len(seeds)
+
+            # The (seed, attempt) each worker is running, so that the run can be failed if the worker dies during it
+            running_tasks = {}
+            while (num_pending > 0):
+                # Sampled before waiting, so that anything a worker sent before it died has arrived when it is given up on
+                workers_alive = [worker.is_alive() for worker in workers]
+                try:
+                    messages = [result_queue.get(timeout=WORKER_POLL_SECONDS)]
+                except queue.Empty:
+                    if (not any(workers_alive)):
+                        for seed in pending_seeds.elements():
+                            failures.append({'seed': seed, 'endpoint': None, 'error': 'All workers exited before the run was completed.'})
+                        break
+
+                    messages = [('error', index, seed, attempt, 'The worker exited during the run.') for index, (seed, attempt) in running_tasks.items() if not workers_alive[index]]
+
+                for message in messages:
+                    if (message[0] == 'start'):
+                        _, index, seed, attempt = message
+                        running_tasks[index] = (seed, attempt)
+                    elif (message[0] == 'result'):
+                        _, index, result = message
+                        running_tasks.pop(index, None)
+                        endpoint = self.endpoints[index]
+                        result['endpoint'] = '{0}:{1}'.format(endpoint[0], endpoint[1])
+                        results.append(result)
+                        pending_seeds[result['seed']] -= 1
+                        num_pending -= 1
+
+                        if (csv_writer is not None):
+                            csv_writer.writerow(result)
+                            results_file.flush()
+                        elif (results_file is not None):
+                            results_file.write(json.dumps(result) + '\n')
+                            results_file.flush()
+                    else:
+                        _, index, seed, attempt, error_text = message
+                        running_tasks.pop(index, None)
+                        if (attempt < self.max_retries):
+                            task_queue.put((seed, attempt + 1))
+                        else:
+                            endpoint = self.endpoints[index]
+                            failures.append({'seed': seed, 'endpoint': '{0}:{1}'.format(endpoint[0], endpoint[1]), 'error': error_text})
+                            pending_seeds[seed] -= 1
+                            num_pending -= 1
+        finally:
+            for _ in workers:
+                task_queue.put(None)
+            for worker in workers:
+                worker.join()
+            if (results_file is not None):
+                results_file.close()
+
+        return self.__get_statistics(results, failures, time.perf_counter() - start_time)
+
+    def __get_telemetry_file_path(self, worker_index):
+        if (self.telemetry_file_path is None):
+            return None
+        return get_worker_telemetry_file_path(self.telemetry_file_path, worker_index)
+
+    def __get_statistics(self, results, failures, total_seconds):
+        statistics = {}
+        statistics['runs'] = len(results)
+        statistics['failures'] = failures
+        statistics['totalSeconds'] = total_seconds
+        statistics['runsPerHour'] = (3600.0 * len(results) / total_seconds) if total_seconds > 0 else 0
+        statistics['meanScore'] = (sum(result['score'] for result in results) / len(results)) if len(results) > 0 else 0
+        statistics['goalsReached'] = sum(1 for result in results if result['goalVisited'])
+
+        total_run_seconds = sum(result['runSeconds'] for result in results)
+        statistics['simSecondsPerWallSecond'] = (sum(result['elapsedTime'] for result in results) / total_run_seconds) if total_run_seconds > 0 else 0
+
+        statistics['runsPerEndpoint'] = {}
+        for result in results:
+            statistics['runsPerEndpoint'][result['endpoint']] = statistics['runsPerEndpoint'].get(result['endpoint'], 0) + 1
+
+        statistics['results'] = sorted(results, key=lambda result: result['seed'])
+
+        return statistics
+
+def get_worker_telemetry_file_path(telemetry_file_path, worker_index):
+    root, extension = os.path.splitext(telemetry_file_path)
+    return '{0}-{1}{2}'.format(root, worker_index, extension)
+
+def run_worker(worker_index, endpoint, config_file_path, controller_factory, task_queue, result_queue, step_seconds=None, telemetry_file_path=None):
+    """ Worker loop: takes (seed, attempt) tasks until it receives None. """
+    runner = None
+    num_consecutive_failures = 0
+
+    # The recorder outlives the runners, which are replaced after a failure
+    telemetry_recorder = None
+    if (telemetry_file_path is not None):
+        telemetry_recorder = telemetry.TelemetryRecorder(telemetry_file_path)
+
+    while True:
+        task = task_queue.get()
+        if (task is None):
+            break
+
+        seed, attempt = task
+        result_queue.put(('start', worker_index, seed, attempt))
+        num_recorded_runs = len(telemetry_recorder.runs) if telemetry_recorder is not None else 0
+        try:
+            if (runner is None):
+                runner = _create_runner(endpoint, config_file_path, controller_factory, step_seconds, telemetry_recorder)
+            result_queue.put(('result', worker_index, runner.run_one(seed)))
+            num_consecutive_failures = 0
+        except Exception:
+            result_queue.put(('error', worker_index, seed, attempt, traceback.format_exc()))
+
+            # The run is retried, so it must not be scored from the telemetry, even if it got as far as ending
+            if (telemetry_recorder is not None and len(telemetry_recorder.runs) > num_recorded_runs):
+                telemetry_recorder.abort_run()
+
+            # The run may have left the connection or the sim in an unknown state, so start over with a new client.
+            # The objects it spawned are deleted first, as far as the sim still answers, or later runs would collide with them.
+            # Back off so that an unreachable simulator does not burn through the retries of the queued runs.
+            if (runner is not None):
+                try:
+                    runner.orchestrator.clean_up_run(runner.client)
+                except Exception:
+                    pass
+            runner = None
+            num_consecutive_failures += 1
+            time.sleep(min(RETRY_BACKOFF_SECONDS * (2 ** (num_consecutive_failures - 1)), MAX_RETRY_BACKOFF_SECONDS))
+
+    if (runner is not None):
+        runner.orchestrator.clean_up_run(runner.client)
+        if (runner.stepper is not None):
+            runner.stepper.stop()
+    if (telemetry_recorder is not None):
+        telemetry_recorder.close()
+
+def _create_runner(endpoint, config_file_path, controller_factory, step_seconds, telemetry_recorder):
+    client = rm_bot_client.RmBotClient(endpoint[0], endpoint[1], RPC_TIMEOUT_SECONDS, max_reconnect_attempts=MAX_RECONNECT_ATTEMPTS)
+    orchestrator = robo_magellan_orchestrator.RoboMagellanCompetitionOrchestrator(config_file_path)
+
+    return batch_runner.BatchRunner(orchestrator, client, controller_factory(), step_seconds=step_seconds, telemetry_recorder=telemetry_recorder)
@@ -0,0 +1,43 @@
+class RunStatus(object):
+    """ The state of the current run, updated in place by run_tick.
+
+    Reading it does not compute anything, so the control loop can check it every tick, e.g.
+    while (not orchestrator.status.run_complete). score is 0 until the run is complete.
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.run_complete = False
+        self.run_end_reason = None
+        self.elapsed_seconds = 0.0
+        self.run_time_seconds = None
+        self.score = 0
+        self.cones_visited = 0
+        self.goal_visited = False
+        self.tick_count = 0
+
+class RunObserver(object):
+    """ Receives the events of the runs of an orchestrator it was added to with add_observer.
+
+    Subclasses override the events they are interested in. The events are raised from run_tick, after the status has been
+    updated, in the order in which run_tick detects them; on_run_complete comes last.
+    """
+    def on_cone_visited(self, orchestrator, cone):
+        pass
+
+    def on_goal_reached(self, orchestrator):
+        pass
+
+    def on_out_of_bounds(self, orchestrator):
+        pass
+
+    def on_collision(self, orchestrator, object_name):
+        """ The bot hit an object that is neither a cone nor the goal. The run only ends because of it with endRunOnCollision. """
+        pass
+
+    def on_time_limit_exceeded(self, orchestrator):
+        pass
+
+    def on_run_complete(self, orchestrator):
+        pass
@@ -1,14 +1,16 @@
+import collections
 import shapely
 import shapely.geometry
 import numpy as np
-import math
+import threading
 
 import airsim
 import airsim.airsim_types as at
+import robo_magellan_orchestrator.polygon_utils as polygon_utils
 import robo_magellan_orchestrator.raycast_utils as raycast_utils
 
 class SpawnableObject(object):
-    def __init__(self, init_parameters):
+    def __init__(self, init_parameters, spawn_pool_size=16):
         if 'poseList' in init_parameters:
             self.pose_list = self.__parse_pose_list(init_parameters['poseList'])
         else:
@@ -16,55 +18,133 @@ class SpawnableObject(object):
 
         if 'spawnRegion' in init_parameters:
             self.spawn_region = self.__parse_spawn_region(init_parameters['spawnRegion'])
+            self.spawn_region_sampler = polygon_utils.PolygonSampler(self.spawn_region)
         else:
             self.spawn_region = None
+            self.spawn_region_sampler = None
 
         if (self.spawn_region == None and self.pose_list == None):
             raise ValueError('Either "poseList" or "spawnRegion" must be specified for all spawnable objects.')
         if (self.spawn_region != None and self.pose_list != None):
             raise ValueError('Both "poseList" and "spawnRegion" cannot be specified for a spawnable object.')
 
+        self.ground_cache = None
+        self.object_registry = None
+
+        # Spawn points that are known to be above ground, so a spawn is a pop instead of a raycast.
+        # Pose lists are static, so each of their entries only needs to be validated once.
+        self.spawn_pool = collections.deque()
+        self.spawn_pool_size = spawn_pool_size
+        self.spawn_pool_exhausted_count = 0
+        self.valid_pose_list = None
+
+        # Once the global random state has been seeded, spawns are drawn from it instead of the pool, which holds points
+        # drawn before the seed was set. Only the candidates that are drawn are validated, and the pool is kept.
+        self.is_seeded = False
+
+    def set_ground_cache(self, ground_cache):
+        self.ground_cache = ground_cache
+
+    def set_object_registry(self, object_registry):
+        """ Objects that spawn a mesh register it in object_registry under its name while it is in the world. """
+        self.object_registry = object_registry
+
+    def get_spawn_bounds_geometry(self):
+        if (self.spawn_region is not None):
+            return self.spawn_region
+
+        return shapely.geometry.MultiPoint([(pose.position.x_val, pose.position.y_val) for pose in self.pose_list])
+
     def get_valid_spawn_coordinates(self, client, align_with_ground):
         if (self.pose_list != None):
             return self.__get_spawn_from_list(client, align_with_ground)
         else:
             return self.__get_spawn_from_region(client, align_with_ground)
 
+    def fill_spawn_pool(self, client, pool_size=None, random_state=None):
+        """ Validates spawn points until the pool holds pool_size of them. Returns the number of points added. """
+        if (pool_size is None):
+            pool_size = self.spawn_pool_size
+
+        if (self.pose_list != None):
+            self.__validate_pose_list(client)
+            return 0
+
+        num_added = 0
+        num_attempts = 0
+        while (len(self.spawn_pool) < pool_size):
+            # Oversample a little so that regions partially under water usually fill in one batch
+            num_missing = pool_size - len(self.spawn_pool)
+            candidates = self.spawn_region_sampler.sample_n(2 * num_missing, random_state)
+            spawn_z, normals = raycast_utils.get_ground_batch(candidates[:, 0], candidates[:, 1], client, self.ground_cache)
+
+            is_valid = ~np.isnan(spawn_z)
+            for i in np.nonzero(is_valid)[0][:num_missing]:
+                self.spawn_pool.append(self.__get_spawn_point(candidates, spawn_z, normals, i))
+                num_added += 1
+
+            num_attempts += 1
+            if (num_added == 0 and num_attempts >= 100):
+                raise ValueError('No point of spawnRegion {0} is above ground.'.format(self.spawn_region.wkt))
+
+        return num_added
+
     def __get_spawn_from_list(self, client, align_with_ground):
-        while True:
-            spawn_xy = np.random.choice(self.pose_list)
-            spawn_z, normal = raycast_utils.get_ground(spawn_xy.position.x_val, spawn_xy.position.y_val, client)
+        self.__validate_pose_list(client)
+        spawn_xy, spawn_z, normal = self.valid_pose_list[np.random.choice(len(self.valid_pose_list))]
+
+        out_vec = at.Vector3r(x_val=spawn_xy.position.x_val, y_val=spawn_xy.position.y_val, z_val = spawn_z)
 
-            if (spawn_z != None and normal != None):
-                out_vec = at.Vector3r(x_val=spawn_xy.position.x_val, y_val=spawn_xy.position.y_val, z_val = spawn_z)
-                
-                if (align_with_ground):
-                    out_rot = normal
-                else:
-                    out_rot = spawn_xy.orientation
+        if (align_with_ground):
+            out_rot = normal
+        else:
+            out_rot = spawn_xy.orientation
 
-                return at.Pose(position_val=out_vec, orientation_val=out_rot)
+        return at.Pose(position_val=out_vec, orientation_val=out_rot)
 
     def __get_spawn_from_region(self, client, align_with_ground):
-        while True:
-            x, y = self.__get_xy_from_rejection_sampling(self.spawn_region)
-            spawn_z, normal = raycast_utils.get_ground(x, y, client)
+        if (self.is_seeded):
+            x, y, spawn_z, normal = self.__draw_seeded_spawn_point(client)
+        else:
+            if (len(self.spawn_pool) == 0):
+                self.spawn_pool_exhausted_count += 1
+                self.fill_spawn_pool(client)
+
+            x, y, spawn_z, normal = self.spawn_pool.popleft()
+        out_vec = at.Vector3r(x_val=x, y_val=y, z_val=spawn_z)
+        out_rot = normal
+
+        return at.Pose(position_val=out_vec, orientation_val=out_rot)
+
+    def __draw_seeded_spawn_point(self, client):
+        for _ in range(0, 100, 1):
+            candidates = self.spawn_region_sampler.sample_n(1)
+            spawn_z, normals = raycast_utils.get_ground_batch(candidates[:, 0], candidates[:, 1], client, self.ground_cache)
+            if (not np.isnan(spawn_z[0])):
+                return self.__get_spawn_point(candidates, spawn_z, normals, 0)
+
+        raise ValueError('No point of spawnRegion {0} is above ground.'.format(self.spawn_region.wkt))
+
+    def __get_spawn_point(self, candidates, spawn_z, normals, i):
+        return (float(candidates[i, 0]), float(candidates[i, 1]), float(spawn_z[i]), at.Vector3r(x_val=float(normals[i, 0]), y_val=float(normals[i, 1]), z_val=float(normals[i, 2])))
+
+    def __validate_pose_list(self, client):
+        if (self.valid_pose_list is not None):
+            return
 
-            if (spawn_z != None and normal != None):
-                out_vec = at.Vector3r(x_val=x, y_val=y, z_val=spawn_z)
-                out_rot = normal
+        xs = [pose.position.x_val for pose in self.pose_list]
+        ys = [pose.position.y_val for pose in self.pose_list]
+        spawn_z, normals = raycast_utils.get_ground_batch(xs, ys, client, self.ground_cache)
 
-                return at.Pose(position_val=out_vec, orientation_val=out_rot)
+        valid_pose_list = []
+        for i in range(0, len(self.pose_list), 1):
+            if (not np.isnan(spawn_z[i])):
+                valid_pose_list.append((self.pose_list[i], float(spawn_z[i]), at.Vector3r(x_val=float(normals[i, 0]), y_val=float(normals[i, 1]), z_val=float(normals[i, 2]))))
 
-    def __get_xy_from_rejection_sampling(self, polygon):
-        min_x, min_y, max_x, max_y = polygon.bounds
-        while True:
-            x = ((max_x - min_x) * np.random.random()) + min_x
-            y = ((max_y - min_y) * np.random.random()) + min_y
-            point = shapely.geometry.Point(x, y)
+        if (len(valid_pose_list) == 0):
+            raise ValueError('None of the poses in poseList are above ground.')
 
-            if (polygon.contains(point)):
-                return (x,y)
+        self.valid_pose_list = valid_pose_list
 
     def __parse_pose_list(self, pose_list):
         valid_poses = []
@@ -82,7 +162,8 @@ class SpawnableObject(object):
             if ('roll' in pose_value):
                 roll = float(pose_value['roll'])
 
-            rot = self.__to_quat(yaw, pitch, roll)
+            # The pitch and roll of the configuration turn the opposite way from airsim's
+            rot = airsim.to_quaternion(-pitch, -roll, yaw)
             pose = at.Pose(position_val=vec, orientation_val=rot)
             valid_poses.append(pose)
 
@@ -95,19 +176,35 @@ class SpawnableObject(object):
 
         return shapely.geometry.polygon.Polygon(spawn_polygon_vertices)
 
-    def __to_quat(self, yaw, pitch, roll):
-        cy = math.cos(yaw * 0.5);
-        sy = math.sin(yaw * 0.5);
-        cp = math.cos(pitch * 0.5);
-        sp = math.sin(pitch * 0.5);
-        cr = math.cos(roll * 0.5);
-        sr = math.sin(roll * 0.5);
-
-        w = cy * cp * cr + sy * sp * sr;
-        x = cy * cp * sr - sy * sp * cr;
-        y = sy * cp * sr + cy * sp * cr;
-        z = sy * cp * cr - cy * sp * sr;
-
-        q = at.Quaternionr(x_val = -x, y_val = -y, z_val = z, w_val = w)
-        
-        return q
+class SpawnPoolRefiller(threading.Thread):
+    """ Keeps the spawn pools of a set of spawnable objects topped up from a background thread.
+
+    A msgpack-rpc connection is not thread safe, so the refiller must be given its own client connected to the same simulator,
+    or share a client created with pool_size > 1.
+    Which points are in a pool when a spawn pops one depends on the timing of the thread, so the pools only serve spawns
+    made without a seed; after set_random_seed, spawns are drawn from the seeded random state whether a refiller runs or not.
+    """
+    def __init__(self, spawnable_objects, client, pool_size=None, random_seed=None, poll_interval=0.05):
+        super(SpawnPoolRefiller, self).__init__()
+        self.daemon = True
+
+        self.spawnable_objects = spawnable_objects
+        self.client = client
+        self.pool_size = pool_size
+        self.random_state = np.random.RandomState(random_seed)
+        self.poll_interval = poll_interval
+        self.error = None
+        self.__stop_event = threading.Event()
+
+    def run(self):
+        try:
+            while not self.__stop_event.is_set():
+                for spawnable in self.spawnable_objects:
+                    spawnable.fill_spawn_pool(self.client, self.pool_size, self.random_state)
+                self.__stop_event.wait(self.poll_interval)
+        except Exception as e:
+            self.error = e
+
+    def stop(self):
+        self.__stop_event.set()
+        self.join()
@@ -0,0 +1,215 @@
+import json
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+# One record per tick. The records are packed back to back in the telemetry file, so it can be memory-mapped with this
+# dtype, and every field is a column of the mapped array (e.g. records['x']).
+TELEMETRY_DTYPE = np.dtype([('run_index', '<u4'),
+                            ('tick', '<u4'),
+                            ('elapsed_seconds', '<f8'),
+                            ('wall_time', '<f8'),
+                            ('x', '<f8'),
+                            ('y', '<f8'),
+                            ('z', '<f8'),
+                            ('qx', '<f4'),
+                            ('qy', '<f4'),
+                            ('qz', '<f4'),
+                            ('qw', '<f4'),
+                            ('vx', '<f4'),
+                            ('vy', '<f4'),
+                            ('vz', '<f4'),
+                            ('wx', '<f4'),
+                            ('wy', '<f4'),
+                            ('wz', '<f4'),
+                            ('left_throttle', '<f4'),
+                            ('right_throttle', '<f4'),
+                            ('collision_object', '<i4'),
+                            ('cones_visited', '<u2'),
+                            ('goal_visited', 'u1'),
+                            ('run_complete', 'u1')])
+
+# collision_object of the ticks that did not register a new collision
+NO_COLLISION = -1
+
+def get_metadata_file_path(file_path):
+    return os.path.splitext(file_path)[0] + '.json'
+
+class TelemetryRecorder(object):
+    """ Records the state of every tick of a series of runs to an append-only binary file.
+
+    record() copies the tick into a preallocated chunk of TELEMETRY_DTYPE records, and full chunks are written to the
+    file by a background thread, so the tick itself never waits on the disk. Chunks are recycled once written.
+
+    The runs are described in a JSON file next to the telemetry file (see get_metadata_file_path), written by close():
+    the configuration each run was scored with, where its records are in the file, and how it ended. collision_object
+    indexes into the run's objectNames, which lists the cones, then the goal cone, then any other object that was hit.
+    A run that is followed by the next one, or by close(), without having been ended with end_run, or that was given up
+    on with abort_run, is marked as aborted: its records stop wherever it failed.
+    If the writer thread fails, the exception is stored in error and raised by the next record() that fills a chunk.
+    """
+    def __init__(self, file_path, chunk_size=4096):
+        if (chunk_size < 1):
+            raise ValueError('chunk_size must be at least 1.')
+
+        self.file_path = file_path
+        self.metadata_file_path = get_metadata_file_path(file_path)
+        self.chunk_size = chunk_size
+        self.runs = []
+        self.record_count = 0
+        self.error = None
+
+        self.__file = open(file_path, 'wb')
+        self.__chunk = np.empty(chunk_size, dtype=TELEMETRY_DTYPE)
+        self.__chunk_length = 0
+        self.__full_chunks = queue.Queue()
+        self.__free_chunks = queue.Queue()
+        self.__run = None
+        self.__run_ended = False
+        self.__run_tick = 0
+        self.__object_indices = {}
+
+        self.__writer = threading.Thread(target=self.__write_chunks)
+        self.__writer.daemon = True
+        self.__writer.start()
+
+    def begin_run(self, run_info):
+        """ Starts a new run. run_info is a JSON serializable dict describing it, and must contain objectNames. """
+        self.__finish_run()
+
+        self.__run = dict(run_info)
+        self.__run['runIndex'] = len(self.runs)
+        self.__run['firstRecord'] = self.record_count
+        self.__run['numRecords'] = 0
+        self.__run['objectNames'] = list(run_info['objectNames'])
+        self.__run['aborted'] = False
+        self.__run_ended = False
+        self.__run_tick = 0
+        self.__object_indices = {object_name: index for index, object_name in enumerate(self.__run['objectNames'])}
+        self.runs.append(self.__run)
+
+    def record(self, elapsed_seconds, snapshot, left_throttle, right_throttle, collision_object_name, cones_visited, goal_visited, run_complete):
+        if (self.__chunk_length == self.chunk_size):
+            self.__flush_chunk()
+
+        collision_object = NO_COLLISION
+        if (collision_object_name is not None):
+            collision_object = self.__object_indices.get(collision_object_name)
+            if (collision_object is None):
+                collision_object = len(self.__run['objectNames'])
+                self.__run['objectNames'].append(collision_object_name)
+                self.__object_indices[collision_object_name] = collision_object
+
+        position = snapshot.pose.position
+        orientation = snapshot.pose.orientation
+        linear_velocity = snapshot.kinematics.linear_velocity
+        angular_velocity = snapshot.kinematics.angular_velocity
+
+        # A single tuple assignment is much cheaper than setting the fields one at a time
+        self.__chunk[self.__chunk_length] = (self.__run['runIndex'],
+                                             self.__run_tick,
+                                             elapsed_seconds,
+                                             time.perf_counter(),
+                                             position.x_val,
+                                             position.y_val,
+                                             position.z_val,
+                                             orientation.x_val,
+                                             orientation.y_val,
+                                             orientation.z_val,
+                                             orientation.w_val,
+                                             linear_velocity.x_val,
+                                             linear_velocity.y_val,
+                                             linear_velocity.z_val,
+                                             angular_velocity.x_val,
+                                             angular_velocity.y_val,
+                                             angular_velocity.z_val,
+                                             left_throttle if left_throttle is not None else np.nan,
+                                             right_throttle if right_throttle is not None else np.nan,
+                                             collision_object,
+                                             cones_visited,
+                                             goal_visited,
+                                             run_complete)
+        self.__chunk_length += 1
+        self.__run_tick += 1
+        self.record_count += 1
+
+    def end_run(self, run_results):
+        """ Adds run_results, a JSON serializable dict with the outcome of the run, to the description of the current run. """
+        if (self.__run is not None):
+            self.__run.update(run_results)
+            self.__run_ended = True
+
+    def abort_run(self):
+        """ Marks the current run as aborted, e.g. because it raised, even if it was ended, and finishes it. """
+        if (self.__run is not None):
+            self.__run_ended = False
+            self.__finish_run()
+
+    def close(self):
+        """ Writes the remaining records and the metadata file. """
+        self.__finish_run()
+        self.__flush_chunk()
+        self.__full_chunks.put(None)
+        self.__writer.join()
+        self.__file.close()
+
+        metadata = {}
+        metadata['fields'] = [[name, TELEMETRY_DTYPE.fields[name][0].str] for name in TELEMETRY_DTYPE.names]
+        metadata['recordCount'] = self.record_count
+        metadata['runs'] = self.runs
+        with open(self.metadata_file_path, 'w') as f:
+            json.dump(metadata, f, indent=2)
+
+        if (self.error is not None):
+            raise self.error
+
+    def __finish_run(self):
+        if (self.__run is not None):
+            self.__run['numRecords'] = self.record_count - self.__run['firstRecord']
+            self.__run['aborted'] = not self.__run_ended
+            self.__run = None
+
+    def __flush_chunk(self):
+        if (self.error is not None):
+            raise self.error
+
+        if (self.__chunk_length > 0):
+            self.__full_chunks.put((self.__chunk, self.__chunk_length))
+            try:
+                self.__chunk = self.__free_chunks.get_nowait()
+            except queue.Empty:
+                self.__chunk = np.empty(self.chunk_size, dtype=TELEMETRY_DTYPE)
+            self.__chunk_length = 0
+
+    def __write_chunks(self):
+        while True:
+            item = self.__full_chunks.get()
+            if (item is None):
+                return
+
+            chunk, chunk_length = item
+            try:
+                if (self.error is None):
+                    chunk[:chunk_length].tofile(self.__file)
+            except Exception as e:
+                self.error = e
+            self.__free_chunks.put(chunk)
+
+def read_telemetry(file_path):
+    """ Returns (records, runs): the records of a telemetry file as a read-only np.memmap, and the runs of its metadata file. """
+    with open(get_metadata_file_path(file_path), 'r') as f:
+        metadata = json.load(f)
+
+    if (metadata['recordCount'] == 0):
+        records = np.empty(0, dtype=TELEMETRY_DTYPE)
+    else:
+        records = np.memmap(file_path, dtype=TELEMETRY_DTYPE, mode='r', shape=(metadata['recordCount'],))
+
+    return records, metadata['runs']
+
+def get_run_records(records, run):
+    """ The records of one run, as a view into records. """
+    return records[run['firstRecord']:run['firstRecord'] + run['numRecords']]
@@ -0,0 +1,19 @@
+class WorldSnapshot(object):
+    def __init__(self, pose, kinematics, collision_info, rpc_count):
+        self.pose = pose
+        self.kinematics = kinematics
+        self.collision_info = collision_info
+        self.rpc_count = rpc_count
+
+    @staticmethod
+    def capture(client, vehicle_name = ''):
+        # All requests are put on the wire before waiting on any of them,
+        # so the whole snapshot costs a single round trip.
+        with client.batch() as batch:
+            already_queued = len(batch)
+            pose_future = client.simGetVehiclePose(vehicle_name)
+            kinematics_future = client.simGetGroundTruthKinematics(vehicle_name)
+            collision_future = client.simGetCollisionInfo(vehicle_name)
+            rpc_count = len(batch) - already_queued
+
+        return WorldSnapshot(pose_future.get(), kinematics_future.get(), collision_future.get(), rpc_count)